@@ -100,6 +100,11 @@ class Namespace:
   names: Set[str] = dataclasses.field(
       default_factory=lambda: set(keyword.kwlist))
 
+  # Maps names to the smallest suffix that `get_new_name` has not yet tried for
+  # them, so repeated requests for the same name don't rescan every suffix.
+  _next_suffix: Dict[str, int] = dataclasses.field(
+      default_factory=dict, init=False, repr=False, compare=False)
+
   def __contains__(self, key: str) -> bool:
     return key in self.names
 
@@ -135,8 +140,9 @@ class Namespace:
     name = prefix + _camel_to_snake(base_name)
     if name not in self.names:
       return self.add(name)
-    for i in itertools.count(start=2):
+    for i in itertools.count(start=self._next_suffix.get(name, 2)):
       if f"{name}_{i}" not in self.names:
+        self._next_suffix[name] = i + 1
         return self.add(f"{name}_{i}")
     raise AssertionError("pytype helper -- itertools.count() is infinite")
 
@@ -16,23 +16,40 @@
 """Library for converting generating fiddlers from diffs."""
 
 import ast
-import collections
 import functools
 import re
 import types
-from typing import List, Tuple, Any, Set, Dict, Callable
+from typing import List, Tuple, Any, Set, Dict, Callable, NamedTuple, Optional
 
 from fiddle import config
 from fiddle.codegen import codegen
+from fiddle.codegen import mini_ast
 from fiddle.codegen import py_val_to_ast_converter
 from fiddle.experimental import daglish
 from fiddle.experimental import diff as fdl_diff
 
+# Expression contexts.  These carry no state, so a single instance of each is
+# shared by all generated nodes.
+_LOAD = ast.Load()
+_STORE = ast.Store()
+_DEL = ast.Del()
+
+# Types whose values are converted to `ast.Constant` by `pyval_to_ast`.
+_CONSTANT_TYPES = frozenset([
+    int, float, complex, bool, str, bytes,
+    type(None),
+    type(Ellipsis)
+])
+
+# Pattern used to generate variable names from paths.
+_NON_IDENTIFIER_RE = re.compile(r'[^a-zA-Z_0-9]+')
+
 
 def fiddler_from_diff(diff: fdl_diff.Diff,
                       old: Any = None,
                       func_name: str = 'fiddler',
-                      param_name: str = 'cfg'):
+                      param_name: str = 'cfg',
+                      path_aliases: Optional['PathAliases'] = None):
   """Returns the AST for a fiddler function that applies the changes in `diff`.
 
   The returned `ast.Module` consists of a set of `import` statements for any
@@ -64,11 +81,113 @@ def fiddler_from_diff(diff: fdl_diff.Diff,
       all referenced paths.
     func_name: The name for the fiddler function.
     param_name: The name for the parameter to the fiddler function.
+    path_aliases: Optional `PathAliases` for `old`.  Finding aliases requires
+      traversing `old`; when generating several fiddlers for the same `old`,
+      pass a single `PathAliases` instance to avoid repeating that traversal.
+      If specified, then `path_aliases.structure` must be `old`.
 
   Returns:
     An `ast.Module` object.  You can convert this to a string using
-    `ast.unparse(result)`.
+    `ast.unparse(result)`, or use `fiddler_source_from_diff` to generate the
+    source code directly.
+  """
+  context = _fiddler_context(diff, old, func_name, param_name, path_aliases)
+
+  body = []
+  body += _ast_for_new_shared_value_variables(diff.new_shared_values,
+                                              context.new_shared_value_names,
+                                              context.pyval_to_ast)
+  body += _ast_for_moved_value_variables(param_name, context.moved_value_names,
+                                         context.path_str)
+  body += _ast_for_changes(diff, param_name, context.moved_value_names,
+                           context.pyval_to_ast, context.path_str)
+
+  imports = _ast_for_imports(context.import_manager)
+  fiddler = _ast_for_fiddler(func_name, param_name, body)
+
+  result = ast.Module(body=imports + [fiddler], type_ignores=[])
+
+  # Add .lineno to AST nodes (required by `ast.unparse`).
+  ast.fix_missing_locations(result)
+
+  return result
+
+
+def fiddler_source_from_diff(diff: fdl_diff.Diff,
+                             old: Any = None,
+                             func_name: str = 'fiddler',
+                             param_name: str = 'cfg',
+                             path_aliases: Optional['PathAliases'] = None):
+  """Returns source code for a fiddler function that applies `diff`.
+
+  The result is the same as `ast.unparse(fiddler_from_diff(...))`, but the
+  statements are generated directly as source code.  Only the values assigned
+  by the fiddler are converted to AST (and then to source code), so this avoids
+  building and unparsing the AST for the rest of the fiddler.
+
+  See `fiddler_from_diff` for a description of the generated function and of
+  the arguments.
+
+  Args:
+    diff: A `fdl.Diff` describing the change that should be made by the fiddler
+      function.
+    old: The original config that is transformed by `diff`.
+    func_name: The name for the fiddler function.
+    param_name: The name for the parameter to the fiddler function.
+    path_aliases: Optional `PathAliases` for `old`.
+
+  Returns:
+    A string containing the source code for the fiddler function (preceded by
+    any necessary `import` statements).
   """
+  context = _fiddler_context(diff, old, func_name, param_name, path_aliases)
+
+  body = []
+  body += _src_for_new_shared_value_variables(diff.new_shared_values,
+                                              context.new_shared_value_names,
+                                              context.pyval_to_ast)
+  body += _src_for_moved_value_variables(param_name, context.moved_value_names,
+                                         context.path_str)
+  body += _src_for_changes(diff, param_name, context.moved_value_names,
+                           context.pyval_to_ast, context.path_str)
+
+  imports = []
+  for imp in context.import_manager.sorted_imports():
+    imports.extend(imp.lines())
+  fiddler = [f'def {func_name}({param_name}):']
+  fiddler.extend('    ' + line for line in body)
+
+  if imports:
+    return '\n'.join(imports + [''] + fiddler)
+  else:
+    return '\n'.join(fiddler)
+
+
+class _FiddlerContext(NamedTuple):
+  """Values shared by the functions that generate a fiddler's body.
+
+  Attributes:
+    import_manager: Manages the imports needed by the fiddler.
+    moved_value_names: Dictionary mapping any paths that might become
+      unreachable once the config is mutated to alias variables that can be used
+      to reach those values.
+    new_shared_value_names: Names for the variables that hold each value in
+      `diff.new_shared_values`.
+    pyval_to_ast: A function used to convert Python values to AST.
+    path_str: A function that converts paths to strings (memoized for the
+      fiddler being generated), used to sort paths.
+  """
+  import_manager: codegen.ImportManager
+  moved_value_names: Dict[daglish.Path, str]
+  new_shared_value_names: List[str]
+  pyval_to_ast: 'PyValToAstFunc'
+  path_str: 'PathStrFunc'
+
+
+def _fiddler_context(diff: fdl_diff.Diff, old: Any, func_name: str,
+                     param_name: str,
+                     path_aliases: Optional['PathAliases']) -> _FiddlerContext:
+  """Allocates names and value converters for a fiddler that applies `diff`."""
   # Create a namespace to keep track of variables that we add.  Reserve the
   # names of the param & func.
   namespace = codegen.Namespace()
@@ -80,20 +199,29 @@ def fiddler_from_diff(diff: fdl_diff.Diff,
   # Get a list of paths that are referenced by the diff.
   used_paths = _find_used_paths(diff)
 
+  # Paths are sorted by their string form several times while generating the
+  # fiddler, so memoize the conversion (for this fiddler only).
+  path_str = _memoized_path_str()
+
   # Add variables for any used paths where the value (or any of the value's
   # ancestors) will be replaced by a change in the diff.  If we don't have an
   # `old` structure, then we pessimistically assume that we need to create
   # variables for all used paths.
   moved_value_names = {}
+  if path_aliases is not None and path_aliases.structure is not old:
+    raise ValueError('path_aliases must be created for `old`.')
   if old is not None:
+    if path_aliases is None:
+      path_aliases = PathAliases(old)
     modified_paths = set(diff.changes)
-    _add_path_aliases(modified_paths, old)
-    for path in sorted(used_paths, key=daglish.path_str):
-      if any(path[:i] in modified_paths for i in range(len(path) + 1)):
+    path_aliases.add_aliases(modified_paths)
+    modified_paths_trie = _path_trie(modified_paths)
+    for path in sorted(used_paths, key=path_str):
+      if _has_prefix_in_trie(path, modified_paths_trie):
         moved_value_names[path] = namespace.get_new_name(
             _path_to_name(path), f'moved_{param_name}_')
   else:
-    for path in sorted(used_paths, key=daglish.path_str):
+    for path in sorted(used_paths, key=path_str):
       moved_value_names[path] = namespace.get_new_name(
           _path_to_name(path), f'original_{param_name}_')
 
@@ -120,37 +248,57 @@ def fiddler_from_diff(diff: fdl_diff.Diff,
               new_shared_value_names=new_shared_value_names)),
   ]
 
-  pyval_to_ast = functools.partial(
-      py_val_to_ast_converter.convert_py_val_to_ast,
-      additional_converters=value_converters)
+  convert_py_val_to_ast = (
+      py_val_to_ast_converter.make_py_val_to_ast_converter(value_converters))
 
-  body = []
-  body += _ast_for_new_shared_value_variables(diff.new_shared_values,
-                                              new_shared_value_names,
-                                              pyval_to_ast)
-  body += _ast_for_moved_value_variables(param_name, moved_value_names)
-  body += _ast_for_changes(diff, param_name, moved_value_names, pyval_to_ast)
+  def pyval_to_ast(value):
+    # Fast path for constants, which make up most of the values in a typical
+    # diff; this skips scanning the list of registered converters.
+    if type(value) in _CONSTANT_TYPES:
+      return ast.Constant(value)
+    return convert_py_val_to_ast(value)
 
-  imports = _ast_for_imports(import_manager)
-  fiddler = _ast_for_fiddler(func_name, param_name, body)
+  return _FiddlerContext(import_manager, moved_value_names,
+                         new_shared_value_names, pyval_to_ast, path_str)
 
-  result = ast.Module(body=imports + [fiddler], type_ignores=[])
 
-  # Add .lineno to AST nodes (required by `ast.unparse`).
-  ast.fix_missing_locations(result)
+def _memoized_path_str() -> 'PathStrFunc':
+  """Returns a function equivalent to `daglish.path_str`, with its own cache."""
+  path_strs = {}
 
-  return result
+  def path_str(path: daglish.Path) -> str:
+    result = path_strs.get(path)
+    if result is None:
+      result = path_strs[path] = daglish.path_str(path)
+    return result
+
+  return path_str
 
 
 def _ast_for_imports(import_manager: codegen.ImportManager) -> List[ast.AST]:
   """Returns a list of `ast.AST` for import satements in `import_manager`."""
-  imp_lines = []
-  for imp in import_manager.sorted_imports():
-    imp_lines.extend(imp.lines())
-  import_str = '\n'.join(imp_lines)
-  module = ast.parse(import_str)
-  assert isinstance(module, ast.Module)
-  return module.body
+  return [_ast_for_import(imp) for imp in import_manager.sorted_imports()]
+
+
+def _ast_for_import(imp: mini_ast.ImportNode) -> ast.AST:
+  """Returns an `ast.Import` or `ast.ImportFrom` for `imp`."""
+  if isinstance(imp, mini_ast.DirectImport):
+    return ast.Import(names=[ast.alias(name=imp.name)])
+  elif isinstance(imp, mini_ast.ImportAs):
+    return ast.Import(names=[ast.alias(name=imp.module, asname=imp.name)])
+  elif isinstance(imp, mini_ast.FromImport):
+    return ast.ImportFrom(
+        module=imp.parent, names=[ast.alias(name=imp.name)], level=0)
+  elif isinstance(imp, mini_ast.FromImportAs):
+    return ast.ImportFrom(
+        module=imp.parent,
+        names=[ast.alias(name=imp.module, asname=imp.name)],
+        level=0)
+  else:
+    # Unknown import type: fall back to parsing the generated source.
+    module = ast.parse('\n'.join(imp.lines()))
+    assert isinstance(module, ast.Module) and len(module.body) == 1
+    return module.body[0]
 
 
 def _ast_for_fiddler(func_name: str, param_name: str,
@@ -177,31 +325,34 @@ def _ast_for_fiddler(func_name: str, param_name: str,
 # A function that takes any python value, and returns an ast node.
 PyValToAstFunc = Callable[[Any], ast.AST]
 
+# A function that converts a path to a string (see `daglish.path_str`).
+PathStrFunc = Callable[[daglish.Path], str]
+
 
 def _ast_for_new_shared_value_variables(
     values: Tuple[Any], names: List[str],
     pyval_to_ast: PyValToAstFunc) -> List[ast.AST]:
   """Returns a list of `ast.AST` for creating new shared value variables."""
   statements = []
-  for value, name in sorted(zip(values, names), key=lambda item: item[1]):
+  for i in sorted(range(len(names)), key=names.__getitem__):
     statements.append(
         ast.Assign(
-            targets=[ast.Name(name, ctx=ast.Store())],
-            value=pyval_to_ast(value)))
+            targets=[ast.Name(names[i], ctx=_STORE)],
+            value=pyval_to_ast(values[i])))
   return statements
 
 
 def _ast_for_moved_value_variables(
-    param_name: str, moved_value_names: Dict[daglish.Path,
-                                             str]) -> List[ast.AST]:
+    param_name: str, moved_value_names: Dict[daglish.Path, str],
+    path_str: PathStrFunc) -> List[ast.AST]:
   """Returns a list of `ast.AST` for creating moved value alias variables."""
   statements = []
   sorted_moved_value_names = sorted(
-      moved_value_names.items(), key=lambda item: daglish.path_str(item[0]))
+      moved_value_names.items(), key=lambda item: path_str(item[0]))
   for path, name in sorted_moved_value_names:
     statements.append(
         ast.Assign(
-            targets=[ast.Name(name, ctx=ast.Store())],
+            targets=[ast.Name(name, ctx=_STORE)],
             value=_ast_for_path(param_name, path)))
   return statements
 
@@ -220,63 +371,130 @@ def _find_used_paths(diff: fdl_diff.Diff) -> Set[daglish.Path]:
   # For each change, we need the path to its *parent* object.
   used_paths = set(path[:-1] for path in diff.changes)
 
-  # For each Reference to `old`, we need the target path.
-  def collect_ref_targets(path, node):
-    del path  # Unused.
-    yield
-    if isinstance(node, fdl_diff.Reference) and node.root == 'old':
-      used_paths.add(node.target)
+  # For each Reference to `old`, we need the target path.  We only need to
+  # read the values, so use a lightweight walk that visits each container
+  # once, rather than `daglish.traverse_with_path` (which also builds paths and
+  # a copy of each container).
+  visited_ids = set()
+
+  def collect_ref_targets(value):
+    if isinstance(value, fdl_diff.Reference):
+      if value.root == 'old':
+        used_paths.add(value.target)
+      return
+    traverser = daglish.find_node_traverser(type(value))
+    if traverser is None or id(value) in visited_ids:
+      return
+    visited_ids.add(id(value))
+    children, _ = traverser.flatten(value)
+    for child in children:
+      collect_ref_targets(child)
 
   for change in diff.changes.values():
     if isinstance(change, (fdl_diff.SetValue, fdl_diff.ModifyValue)):
-      daglish.traverse_with_path(collect_ref_targets, change.new_value)
-  daglish.traverse_with_path(collect_ref_targets, diff.new_shared_values)
+      collect_ref_targets(change.new_value)
+  collect_ref_targets(diff.new_shared_values)
 
   return used_paths
 
 
-def _add_path_aliases(paths: Set[daglish.Path], structure: Any):
-  """Update `paths` to include any other paths that reach the same objects.
-
-  If any value `v` reachable by a path `p` in `paths` is also reachable by one
-  or more other paths, then add those paths to `paths`.  E.g., if a shared
-  object is reachable by paths `.x.y` and `.x.z', and `paths` includes
-  only `.x.y`, then this will add `.x.z` to `paths`.
+class PathAliases:
+  """Finds paths that reach the same objects in a structure.
 
-  Args:
-    paths: A set of paths to values in `structure`.
-    structure: The structure used to determine the paths for shared values.
+  The paths in `structure` are collected the first time `add_aliases` is
+  called, and reused afterwards.  `structure` should therefore not be
+  mutated while a `PathAliases` for it is in use.
   """
-  path_to_value = daglish.collect_value_by_path(structure, memoizable_only=True)
-  id_to_paths = daglish.collect_paths_by_id(structure, memoizable_only=True)
 
-  for path in list(paths):
-    value = path_to_value.get(path, None)  # None if not memoizable.
-    if value is not None:
-      paths.update(id_to_paths[id(value)])
+  def __init__(self, structure: Any):
+    """Constructor.
+
+    Args:
+      structure: The structure used to determine the paths for shared values.
+    """
+    self.structure = structure
+    self._path_to_value: Optional[Dict[daglish.Path, Any]] = None
+    self._id_to_paths: Optional[Dict[int, List[daglish.Path]]] = None
+
+  def add_aliases(self, paths: Set[daglish.Path]):
+    """Update `paths` to include any other paths that reach the same objects.
+
+    If any value `v` reachable by a path `p` in `paths` is also reachable by one
+    or more other paths, then add those paths to `paths`.  E.g., if a shared
+    object is reachable by paths `.x.y` and `.x.z', and `paths` includes
+    only `.x.y`, then this will add `.x.z` to `paths`.
+
+    Args:
+      paths: A set of paths to values in `self.structure`.
+    """
+    if self._path_to_value is None:
+      self._path_to_value = daglish.collect_value_by_path(
+          self.structure, memoizable_only=True)
+      self._id_to_paths = daglish.collect_paths_by_id(
+          self.structure, memoizable_only=True)
+
+    for path in list(paths):
+      value = self._path_to_value.get(path, None)  # None if not memoizable.
+      if value is not None:
+        paths.update(self._id_to_paths[id(value)])
+
+
+# A trie of paths: nested dicts keyed by `PathElement`.  The key `None` marks
+# the end of a path that is contained in the trie.
+PathTrie = Dict[Any, Any]
+
+
+def _path_trie(paths: Set[daglish.Path]) -> PathTrie:
+  """Returns a `PathTrie` containing `paths`."""
+  trie = {}
+  for path in paths:
+    node = trie
+    for path_elt in path:
+      node = node.setdefault(path_elt, {})
+    node[None] = True
+  return trie
+
+
+def _has_prefix_in_trie(path: daglish.Path, trie: PathTrie) -> bool:
+  """Returns true if `path` or any prefix of `path` is contained in `trie`."""
+  node = trie
+  if None in node:
+    return True
+  for path_elt in path:
+    node = node.get(path_elt)
+    if node is None:
+      return False
+    if None in node:
+      return True
+  return False
 
 
 ChangeToChild = Tuple[daglish.PathElement, fdl_diff.DiffOperation]
 ChangesByParent = List[Tuple[daglish.Path, List[ChangeToChild]]]
 
 
-def _group_changes_by_parent(diff: fdl_diff.Diff) -> ChangesByParent:
+def _group_changes_by_parent(diff: fdl_diff.Diff,
+                             path_str: PathStrFunc) -> ChangesByParent:
   """Returns a sorted list of changes in `diff`, grouped by their parent."""
-  # Group changes by parent path.
-  changes_by_parent = collections.defaultdict(list)
-  for (path, change) in diff.changes.items():
-    if not path:
-      raise ValueError('Changing the root object is not supported')
-    changes_by_parent[path[:-1]].append((path[-1], change))
+  if () in diff.changes:
+    raise ValueError('Changing the root object is not supported')
 
-  # Sort by path (converted to path_str).
-  return sorted(
-      changes_by_parent.items(), key=lambda item: daglish.path_str(item[0]))
+  # Sort changes by parent path (converted to path_str).  The sort is stable,
+  # so changes to the same parent stay in their original order; and grouping
+  # the sorted changes yields the groups in sorted order.
+  sorted_changes = sorted(
+      diff.changes.items(), key=lambda item: path_str(item[0][:-1]))
+
+  changes_by_parent = {}
+  for (path, change) in sorted_changes:
+    changes_by_parent.setdefault(path[:-1], []).append((path[-1], change))
+  return list(changes_by_parent.items())
 
 
 def _ast_for_changes(diff: fdl_diff.Diff, param_name: str,
                      moved_value_names: Dict[daglish.Path, str],
-                     pyval_to_ast: PyValToAstFunc) -> List[ast.AST]:
+                     pyval_to_ast: PyValToAstFunc,
+                     path_str: PathStrFunc) -> List[ast.AST]:
   """Returns a list of AST nodes that apply the changes described in `diff`.
 
   Args:
@@ -286,15 +504,16 @@ def _ast_for_changes(diff: fdl_diff.Diff, param_name: str,
       unreachable once the config is mutated to alias variables that can be used
       to reach those values.
     pyval_to_ast: A function used to convert Python values to AST.
+    path_str: A function that converts paths to strings.
   """
   body = []
 
   # Apply changes to a single parent at a time.
-  for parent_path, changes in _group_changes_by_parent(diff):
+  for parent_path, changes in _group_changes_by_parent(diff, path_str):
 
     # Get an AST expression that can be used to refer to the parent.
     if parent_path in moved_value_names:
-      parent_ast = ast.Name(moved_value_names[parent_path], ctx=ast.Load())
+      parent_ast = ast.Name(moved_value_names[parent_path], ctx=_LOAD)
     else:
       parent_ast = _ast_for_path(param_name, parent_path)
 
@@ -309,7 +528,7 @@ def _ast_for_changes(diff: fdl_diff.Diff, param_name: str,
     for child_path_elt, change in changes:
       child_ast = _ast_for_child(parent_ast, child_path_elt, pyval_to_ast)
 
-      if isinstance(child_path_elt, daglish.BuildableFnOrCls):
+      if type(child_path_elt) is daglish.BuildableFnOrCls:  # pylint: disable=unidiomatic-typecheck
         assert isinstance(change, fdl_diff.ModifyValue)
         assert update_callable is None
         new_value_ast = pyval_to_ast(change.new_value)
@@ -319,18 +538,15 @@ def _ast_for_changes(diff: fdl_diff.Diff, param_name: str,
                 args=[parent_ast, new_value_ast],
                 keywords=[]))
 
-      elif isinstance(change, fdl_diff.DeleteValue):
-        child_ast.ctx = ast.Del()
+      elif _change_kind(change) is _DELETE_CHANGE:
+        child_ast.ctx = _DEL
         deletes.append(ast.Delete(targets=[child_ast]))
 
-      elif isinstance(change, (fdl_diff.SetValue, fdl_diff.ModifyValue)):
-        child_ast.ctx = ast.Store()
+      else:  # _ASSIGN_CHANGE
+        child_ast.ctx = _STORE
         new_value_ast = pyval_to_ast(change.new_value)
         assigns.append(ast.Assign(targets=[child_ast], value=new_value_ast))
 
-      else:
-        raise ValueError(f'Unsupported DiffOperation {type(change)}')
-
     body.extend(deletes)
     if update_callable is not None:
       body.append(update_callable)
@@ -339,6 +555,35 @@ def _ast_for_changes(diff: fdl_diff.Diff, param_name: str,
   return body
 
 
+# The kinds of statement used to apply a `DiffOperation`.
+_DELETE_CHANGE = 'delete'
+_ASSIGN_CHANGE = 'assign'
+
+# Maps `DiffOperation` types to the kind of statement used to apply them.
+# `DiffOperation` is an abstract base class, so `isinstance` checks against its
+# subclasses are relatively expensive; looking up `type(change)` in this dict
+# avoids them for the common case.
+_CHANGE_KINDS = {
+    fdl_diff.DeleteValue: _DELETE_CHANGE,
+    fdl_diff.SetValue: _ASSIGN_CHANGE,
+    fdl_diff.ModifyValue: _ASSIGN_CHANGE,
+}
+
+
+def _change_kind(change: fdl_diff.DiffOperation) -> str:
+  """Returns the kind of statement used to apply `change`."""
+  kind = _CHANGE_KINDS.get(type(change))
+  if kind is not None:
+    return kind
+  # Fall back to `isinstance` for subclasses of the `DiffOperation` types.
+  if isinstance(change, fdl_diff.DeleteValue):
+    return _DELETE_CHANGE
+  elif isinstance(change, (fdl_diff.SetValue, fdl_diff.ModifyValue)):
+    return _ASSIGN_CHANGE
+  else:
+    raise ValueError(f'Unsupported DiffOperation {type(change)}')
+
+
 def _ast_for_child(parent_ast: ast.AST, child_path_elt: daglish.PathElement,
                    pyval_to_ast: PyValToAstFunc) -> ast.AST:
   """Returns an AST expression that can be used to access a child of a parent.
@@ -350,39 +595,164 @@ def _ast_for_child(parent_ast: ast.AST, child_path_elt: daglish.PathElement,
   """
   if isinstance(child_path_elt, daglish.Attr):
     return ast.Attribute(
-        value=parent_ast, attr=child_path_elt.name, ctx=ast.Load())
+        value=parent_ast, attr=child_path_elt.name, ctx=_LOAD)
   elif isinstance(child_path_elt, daglish.Index):
     index_ast = pyval_to_ast(child_path_elt.index)
-    return ast.Subscript(value=parent_ast, slice=index_ast, ctx=ast.Load())
+    return ast.Subscript(value=parent_ast, slice=index_ast, ctx=_LOAD)
   elif isinstance(child_path_elt, daglish.Key):
     key_ast = pyval_to_ast(child_path_elt.key)
-    return ast.Subscript(value=parent_ast, slice=key_ast, ctx=ast.Load())
+    return ast.Subscript(value=parent_ast, slice=key_ast, ctx=_LOAD)
   else:
     raise ValueError(f'Unsupported PathElement {type(child_path_elt)}')
 
 
 def _ast_for_path(name: str, path: daglish.Path):
   """Converts a `daglish.Path` to an `ast.AST` expression."""
-  node = ast.Name(id=name, ctx=ast.Load())
+  node = ast.Name(id=name, ctx=_LOAD)
   for path_elt in path:
     if isinstance(path_elt, daglish.Index):
       node = ast.Subscript(
-          value=node, slice=ast.Constant(path_elt.index), ctx=ast.Load())
+          value=node, slice=ast.Constant(path_elt.index), ctx=_LOAD)
     elif isinstance(path_elt, daglish.Key):
       assert isinstance(path_elt.key, (int, str, bool))
       node = ast.Subscript(
-          value=node, slice=ast.Constant(path_elt.key), ctx=ast.Load())
+          value=node, slice=ast.Constant(path_elt.key), ctx=_LOAD)
     elif isinstance(path_elt, daglish.Attr):
-      node = ast.Attribute(value=node, attr=path_elt.name, ctx=ast.Load())
+      node = ast.Attribute(value=node, attr=path_elt.name, ctx=_LOAD)
     else:
       raise ValueError(f'Unsupported PathElement {path_elt}')
   return node
 
 
+def _src_for_new_shared_value_variables(
+    values: Tuple[Any], names: List[str],
+    pyval_to_ast: PyValToAstFunc) -> List[str]:
+  """Returns source lines for creating new shared value variables."""
+  lines = []
+  for i in sorted(range(len(names)), key=names.__getitem__):
+    lines.append(f'{names[i]} = {ast.unparse(pyval_to_ast(values[i]))}')
+  return lines
+
+
+def _src_for_moved_value_variables(param_name: str,
+                                   moved_value_names: Dict[daglish.Path, str],
+                                   path_str: PathStrFunc) -> List[str]:
+  """Returns source lines for creating moved value alias variables."""
+  sorted_moved_value_names = sorted(
+      moved_value_names.items(), key=lambda item: path_str(item[0]))
+  return [
+      f'{name} = {_src_for_path(param_name, path)}'
+      for path, name in sorted_moved_value_names
+  ]
+
+
+def _src_for_changes(diff: fdl_diff.Diff, param_name: str,
+                     moved_value_names: Dict[daglish.Path, str],
+                     pyval_to_ast: PyValToAstFunc,
+                     path_str: PathStrFunc) -> List[str]:
+  """Returns source lines that apply the changes described in `diff`.
+
+  This is the source code equivalent of `_ast_for_changes`.  Values are
+  converted in the same order, so that the same import names are allocated.
+
+  Args:
+    diff: The `fdl.Diff` whose changes should be applied.
+    param_name: The name of the parameter to the fiddler function.
+    moved_value_names: Dictionary mapping any paths that might become
+      unreachable once the config is mutated to alias variables that can be used
+      to reach those values.
+    pyval_to_ast: A function used to convert Python values to AST.
+    path_str: A function that converts paths to strings.
+  """
+  lines = []
+
+  for parent_path, changes in _group_changes_by_parent(diff, path_str):
+    if parent_path in moved_value_names:
+      parent_src = moved_value_names[parent_path]
+    else:
+      parent_src = _src_for_path(param_name, parent_path)
+
+    # See `_ast_for_changes` for an explanation of the statement order.
+    deletes = []
+    update_callable = None
+    assigns = []
+    for child_path_elt, change in changes:
+      child_src = _src_for_child(parent_src, child_path_elt, pyval_to_ast)
+
+      if type(child_path_elt) is daglish.BuildableFnOrCls:  # pylint: disable=unidiomatic-typecheck
+        assert isinstance(change, fdl_diff.ModifyValue)
+        assert update_callable is None
+        new_value_src = ast.unparse(pyval_to_ast(change.new_value))
+        func_src = ast.unparse(pyval_to_ast(config.update_callable))
+        update_callable = f'{func_src}({parent_src}, {new_value_src})'
+
+      elif _change_kind(change) is _DELETE_CHANGE:
+        deletes.append(f'del {child_src}')
+
+      else:  # _ASSIGN_CHANGE
+        new_value_src = ast.unparse(pyval_to_ast(change.new_value))
+        assigns.append(f'{child_src} = {new_value_src}')
+
+    lines.extend(deletes)
+    if update_callable is not None:
+      lines.append(update_callable)
+    lines.extend(assigns)
+
+  return lines
+
+
+def _src_for_child(parent_src: str, child_path_elt: daglish.PathElement,
+                   pyval_to_ast: PyValToAstFunc) -> str:
+  """Returns a source expression that accesses a child of a parent.
+
+  Args:
+    parent_src: Source expression for the parent object.
+    child_path_elt: A PathElement specifying a child of the parent.
+    pyval_to_ast: A function used to convert Python values to AST.
+  """
+  if isinstance(child_path_elt, daglish.Attr):
+    return f'{parent_src}.{child_path_elt.name}'
+  elif isinstance(child_path_elt, daglish.Index):
+    index_ast = pyval_to_ast(child_path_elt.index)
+    return f'{parent_src}[{_src_for_slice(index_ast)}]'
+  elif isinstance(child_path_elt, daglish.Key):
+    key_ast = pyval_to_ast(child_path_elt.key)
+    return f'{parent_src}[{_src_for_slice(key_ast)}]'
+  else:
+    raise ValueError(f'Unsupported PathElement {type(child_path_elt)}')
+
+
+def _src_for_slice(node: ast.AST) -> str:
+  """Returns source code for `node`, when used as a subscript's slice."""
+  # Match `ast.unparse`, which omits the parentheses for tuple slices.
+  if isinstance(node, ast.Tuple) and node.elts:
+    src = ', '.join(ast.unparse(elt) for elt in node.elts)
+    return src + ',' if len(node.elts) == 1 else src
+  return ast.unparse(node)
+
+
+def _src_for_path(name: str, path: daglish.Path) -> str:
+  """Converts a `daglish.Path` to a source expression."""
+  pieces = [name]
+  for path_elt in path:
+    if isinstance(path_elt, daglish.Index):
+      pieces.append(f'[{path_elt.index}]')
+    elif isinstance(path_elt, daglish.Key):
+      assert isinstance(path_elt.key, (int, str, bool))
+      pieces.append(f'[{ast.unparse(ast.Constant(path_elt.key))}]')
+    elif isinstance(path_elt, daglish.Attr):
+      pieces.append(f'.{path_elt.name}')
+    else:
+      raise ValueError(f'Unsupported PathElement {path_elt}')
+  return ''.join(pieces)
+
+
 def _camel_to_snake(name: str) -> str:
   """Converts a camel or studly-caps name to a snake_case name."""
-  return re.sub(r'(?<=.)([A-Z])', lambda m: '_' + m.group(0).lower(),
-                name).lower()
+  # A single pass over the characters is faster than `re.sub` for the short
+  # names used here.
+  return (name[:1] + ''.join(
+      ['_' + c if 'A' <= c <= 'Z' else c for c in name[1:]])).lower()
 
 
 def _name_for_value(value: Any) -> str:
@@ -396,7 +766,7 @@ def _name_for_value(value: Any) -> str:
 def _path_to_name(path: daglish.Path) -> str:
   """Converts a path to a variable name."""
   name = daglish.path_str(path)
-  name = re.sub('[^a-zA-Z_0-9]+', '_', name)
+  name = _NON_IDENTIFIER_RE.sub('_', name)
   return name.strip('_').lower()
 
 
@@ -406,7 +776,7 @@ def _convert_reference(value, convert_child, param_name, moved_value_names,
   del convert_child  # Unused.
   if value.root == 'old':
     if value.target in moved_value_names:
-      return ast.Name(moved_value_names[value.target], ctx=ast.Load())
+      return ast.Name(moved_value_names[value.target], ctx=_LOAD)
     else:
       return _ast_for_path(param_name, value.target)
   else:
@@ -0,0 +1,200 @@
+# coding=utf-8
+# Copyright 2022 The Fiddle-Config Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for codegen_diff."""
+import ast
+import copy
+import dataclasses
+import textwrap
+from typing import Any
+
+from absl.testing import absltest
+from absl.testing import parameterized
+import fiddle as fdl
+from fiddle.codegen import codegen_diff
+from fiddle.experimental import daglish
+from fiddle.experimental import diff as fdl_diff
+
+
+@dataclasses.dataclass
+class SimpleClass:
+  x: Any = None
+  y: Any = None
+  z: Any = None
+
+
+@dataclasses.dataclass
+class AnotherClass:
+  x: Any = None
+  y: Any = None
+  a: Any = None
+  b: Any = None
+
+
+def make_config():
+  shared = fdl.Config(SimpleClass, x=[1, 2], y='s')
+  return fdl.Config(
+      SimpleClass,
+      x=fdl.Config(SimpleClass, x=shared, y=(3, 4)),
+      y=[shared, fdl.Partial(AnotherClass, a=1, b={'q': shared})],
+      z={
+          'a': shared,
+          'b': fdl.Config(SimpleClass, z=7),
+          ('t', 1): 8,
+          2: 'two'
+      })
+
+
+def add_shared_value(new):
+  shared = fdl.Config(AnotherClass, x=1)
+  new.x.y = (shared, shared)
+
+
+def move_shared_value(new):
+  new.z['c'] = [new.x.x, new.x.x]
+  new.x.x.x[1] = 'changed'
+
+
+def delete_values(new):
+  del new.z['a']
+  del new.y[1].b
+
+
+def update_callable(new):
+  del new.z['b'].z
+  fdl.update_callable(new.z['b'], AnotherClass)
+  new.z['b'].a = 5
+
+
+def set_keys(new):
+  new.z[('t', 1)] = 9
+  new.z[2] = 'deux'
+
+
+def add_import(new):
+  new.x.z = fdl_diff
+
+
+def all_changes(new):
+  for mutate in (add_shared_value, move_shared_value, delete_values,
+                 update_callable, set_keys, add_import):
+    mutate(new)
+
+
+def build_diff(old, mutate):
+  new = copy.deepcopy(old)
+  mutate(new)
+  alignment = fdl_diff.align_heuristically(old, new)
+  return fdl_diff.build_diff_from_alignment(alignment)
+
+
+_MUTATIONS = (
+    ('add_shared_value', add_shared_value),
+    ('move_shared_value', move_shared_value),
+    ('delete_values', delete_values),
+    ('update_callable', update_callable),
+    ('set_keys', set_keys),
+    ('add_import', add_import),
+    ('all_changes', all_changes),
+)
+
+
+class FiddlerFromDiffTest(parameterized.TestCase):
+
+  def test_fiddler_from_diff(self):
+    old = make_config()
+    diff = build_diff(old, all_changes)
+    fiddler = ast.unparse(codegen_diff.fiddler_from_diff(diff, old=old))
+    expected = textwrap.dedent("""\
+        import fiddle as fdl
+        from fiddle.codegen import codegen_diff_test
+        from fiddle.experimental import diff
+
+        def fiddler(cfg):
+            shared_another_class = fdl.Config(codegen_diff_test.AnotherClass, x=1)
+            moved_cfg_x_x = cfg.x.x
+            moved_cfg_x_x_x = cfg.x.x.x
+            cfg.x.z = diff
+            moved_cfg_x_x_x[1] = 'changed'
+            cfg.x.y[0] = shared_another_class
+            cfg.x.y[1] = shared_another_class
+            del cfg.y[1].b
+            del cfg.z['a']
+            cfg.z['t', 1] = 9
+            cfg.z[2] = 'deux'
+            cfg.z['c'] = [moved_cfg_x_x, moved_cfg_x_x]
+            del cfg.z['b'].z
+            fdl.update_callable(cfg.z['b'], codegen_diff_test.AnotherClass)
+            cfg.z['b'].a = 5""")
+    self.assertEqual(fiddler, expected)
+
+  @parameterized.named_parameters(*_MUTATIONS)
+  def test_fiddler_source_from_diff_matches_ast(self, mutate):
+    old = make_config()
+    diff = build_diff(old, mutate)
+    for diff_old in (old, None):
+      with self.subTest(has_old=diff_old is not None):
+        expected = ast.unparse(
+            codegen_diff.fiddler_from_diff(diff, old=diff_old))
+        self.assertEqual(
+            codegen_diff.fiddler_source_from_diff(diff, old=diff_old),
+            expected)
+
+
+class PathAliasesTest(absltest.TestCase):
+
+  def test_add_aliases(self):
+    old = make_config()
+    path_aliases = codegen_diff.PathAliases(old)
+    paths = {(daglish.Attr('y'), daglish.Index(0))}
+    path_aliases.add_aliases(paths)
+    self.assertEqual(
+        paths, {
+            (daglish.Attr('x'), daglish.Attr('x')),
+            (daglish.Attr('y'), daglish.Index(0)),
+            (daglish.Attr('y'), daglish.Index(1), daglish.Attr('b'),
+             daglish.Key('q')),
+            (daglish.Attr('z'), daglish.Key('a')),
+        })
+
+  def test_reused_path_aliases(self):
+    old = make_config()
+    path_aliases = codegen_diff.PathAliases(old)
+    for _, mutate in _MUTATIONS:
+      diff = build_diff(old, mutate)
+      expected = ast.unparse(codegen_diff.fiddler_from_diff(diff, old=old))
+      self.assertEqual(
+          ast.unparse(
+              codegen_diff.fiddler_from_diff(
+                  diff, old=old, path_aliases=path_aliases)), expected)
+      self.assertEqual(
+          codegen_diff.fiddler_source_from_diff(
+              diff, old=old, path_aliases=path_aliases), expected)
+
+  def test_path_aliases_for_other_structure(self):
+    old = make_config()
+    diff = build_diff(old, set_keys)
+    path_aliases = codegen_diff.PathAliases(make_config())
+    with self.assertRaisesRegex(ValueError, 'path_aliases must be created'):
+      codegen_diff.fiddler_from_diff(diff, old=old, path_aliases=path_aliases)
+    with self.assertRaisesRegex(ValueError, 'path_aliases must be created'):
+      codegen_diff.fiddler_source_from_diff(
+          diff, old=old, path_aliases=path_aliases)
+    with self.assertRaisesRegex(ValueError, 'path_aliases must be created'):
+      codegen_diff.fiddler_from_diff(diff, path_aliases=path_aliases)
+
+
+if __name__ == '__main__':
+  absltest.main()
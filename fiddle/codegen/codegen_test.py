@@ -139,6 +139,16 @@ class CodegenTest(absltest.TestCase):
     self.assertEqual(foos, [2, 3, 1])
     self.assertIs(result, cfg)
 
+  def test_namespace_get_new_name(self):
+    namespace = codegen.Namespace()
+    namespace.add("shared_foo_3")
+    self.assertEqual(namespace.get_new_name("Foo"), "shared_foo")
+    self.assertEqual(namespace.get_new_name("Foo"), "shared_foo_2")
+    self.assertEqual(namespace.get_new_name("Foo"), "shared_foo_4")
+    namespace.add("shared_foo_5")
+    self.assertEqual(namespace.get_new_name("Foo"), "shared_foo_6")
+    self.assertEqual(namespace.get_new_name("foo", prefix=""), "foo")
+
   def test_codegen_dot_syntax_shared(self):
     cfg = shared_config()
     result = codegen.codegen_dot_syntax(cfg)
@@ -101,12 +101,35 @@ def convert_py_val_to_ast(value: Any,
     ValueError: If there is no registered value converter that can handle
     `value` (or some object nested in `value`).
   """
+  return make_py_val_to_ast_converter(additional_converters)(value)
+
+
+def make_py_val_to_ast_converter(
+    additional_converters: Sequence[ValueConverter] = ()) -> PyValToAstFunc:
+  """Returns a function that converts Python values to `ast` expressions.
+
+  The returned function is equivalent to calling `convert_py_val_to_ast` with
+  `additional_converters`, but the list of converters is only assembled once.
+  Use this when converting many values with the same `additional_converters`.
+
+  Note: converters registered with `@register_py_val_to_ast_converter` after
+  this function is called are not used by the returned function.
+
+  Args:
+    additional_converters: A list of `ValueConverter`s that should be added to
+      the default list of converters.  If any converter has the same matcher as
+      a default converter, then it will replace that converter.
+
+  Returns:
+    A function that takes a Python value, and returns an AST node for an
+    expression that evaluates to that value.
+  """
   converter = _py_val_to_ast_converter
   if additional_converters:
     converter = _py_val_to_ast_converter.copy()
     for additional_converter in additional_converters:
       converter.add_converter(additional_converter)
-  return converter.convert(value)
+  return converter.convert
 
 
 ValueConverterDecorator = Callable[[ValueConverterFunc], ValueConverterFunc]
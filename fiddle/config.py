@@ -150,7 +150,7 @@ class Buildable(Generic[T], metaclass=abc.ABCMeta):
     return rebuilt
 
   def __path_elements__(self):
-    return tuple(daglish.Attr(name) for name in self.__arguments__.keys())
+    return tuple(daglish.Attr.get(name) for name in self.__arguments__.keys())
 
   def __getattr__(self, name: str):
     """Get parameter with given `name`."""
@@ -272,7 +272,11 @@ class Buildable(Generic[T], metaclass=abc.ABCMeta):
     """
     values, metadata = self.__flatten__()
     deepcopied_values = copy.deepcopy(values, memo)
-    deepcopied_metadata = copy.deepcopy(metadata, memo)
+    # Argument names are strings and tags are classes, both of which `deepcopy`
+    # returns as-is, and `__unflatten__` already builds fresh tag sets; only
+    # `fn_or_cls` needs to go through `deepcopy`.
+    deepcopied_metadata = metadata._replace(
+        fn_or_cls=copy.deepcopy(metadata.fn_or_cls, memo))
     return self.__unflatten__(deepcopied_values, deepcopied_metadata)
 
   def __eq__(self, other):
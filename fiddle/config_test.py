@@ -647,6 +647,14 @@ class ConfigTest(absltest.TestCase):
     self.assertEqual(frozenset([Tag1]), config.get_tags(cfg, 'arg1'))
     self.assertEqual(frozenset([Tag1, Tag2]), config.get_tags(copied, 'arg1'))
 
+  def test_deepcopy_tags(self):
+    cfg = config.Config(SampleClass)
+    config.add_tag(cfg, 'arg1', Tag1)
+    copied = copy.deepcopy(cfg)
+    config.add_tag(copied, 'arg1', Tag2)
+    self.assertEqual(frozenset([Tag1]), config.get_tags(cfg, 'arg1'))
+    self.assertEqual(frozenset([Tag1, Tag2]), config.get_tags(copied, 'arg1'))
+
   def test_dir_simple(self):
     fn_config = config.Config(basic_fn)
     self.assertEqual(['arg1', 'arg2', 'kwarg1', 'kwarg2'], dir(fn_config))
@@ -18,13 +18,20 @@
 import abc
 import collections
 import dataclasses
+import functools
 import inspect
 from typing import Any, Callable, Dict, Generator, Iterable, List, Optional, Tuple, Type, TypeVar, Union
 
+from fiddle import frozen_slots
 
-class PathElement(metaclass=abc.ABCMeta):
+
+class PathElement(frozen_slots.FrozenWithSlots, metaclass=abc.ABCMeta):
   """Element of a path."""
 
+  # Path elements are created (and hashed) for every node in a traversal, so
+  # they use `__slots__` to keep them small.
+  __slots__ = ()
+
   @property
   @abc.abstractmethod
   def code(self) -> str:
@@ -39,8 +46,27 @@ class PathElement(metaclass=abc.ABCMeta):
 @dataclasses.dataclass(frozen=True)
 class Index(PathElement):
   """An index into a sequence (list or tuple)."""
+  __slots__ = ("index",)
   index: int
 
+  @classmethod
+  def get(cls, index: int) -> "Index":
+    """Returns an `Index` for `index`, reusing a shared instance if possible.
+
+    Small non-negative indices are interned.  Equal path elements that are the
+    same object compare (and thus look up paths in dicts and sets) faster.
+
+    Args:
+      index: The index.
+    """
+    if (cls is not Index or type(index) is not int or  # pylint: disable=unidiomatic-typecheck
+        not 0 <= index < _MAX_INTERNED_INDEX):
+      return cls(index)
+    result = _interned_indices.get(index)
+    if result is None:
+      result = _interned_indices[index] = cls(index)
+    return result
+
   @property
   def code(self) -> str:
     return f"[{self.index}]"
@@ -52,8 +78,24 @@ class Index(PathElement):
 @dataclasses.dataclass(frozen=True)
 class Key(PathElement):
   """A key of a mapping (e.g., dict)."""
+  __slots__ = ("key",)
   key: Any
 
+  @classmethod
+  def get(cls, key: Any) -> "Key":
+    """Returns a `Key` for `key`, reusing a shared instance if possible.
+
+    Only string keys are interned, since distinct keys of other types may be
+    equal (such as `1` and `True`).  Keys come from user data, so only the
+    most recently used ones are kept.
+
+    Args:
+      key: The key.
+    """
+    if cls is not Key or type(key) is not str:  # pylint: disable=unidiomatic-typecheck
+      return cls(key)
+    return _interned_str_key(key)
+
   @property
   def code(self) -> str:
     return f"[{self.key!r}]"
@@ -65,8 +107,22 @@ class Key(PathElement):
 @dataclasses.dataclass(frozen=True)
 class Attr(PathElement):
   """An attribute of an object."""
+  __slots__ = ("name",)
   name: str
 
+  @classmethod
+  def get(cls, name: str) -> "Attr":
+    """Returns an interned instance of `cls` for `name`.
+
+    Equal path elements that are the same object compare (and thus look up
+    paths in dicts and sets) faster.  Only the most recently used instances are
+    kept.
+
+    Args:
+      name: The attribute name.
+    """
+    return _interned_attr(cls, name)
+
   @property
   def code(self) -> str:
     return f".{self.name}"
@@ -77,11 +133,30 @@ class Attr(PathElement):
 
 class BuildableAttr(Attr):
   """An attribute of a Buildable."""
+  __slots__ = ()
+
+
+# Caches used to intern `Index`, `Key` and `Attr` path elements.
+_MAX_INTERNED_INDEX = 1024
+_interned_indices: Dict[int, Index] = {}
+_MAX_INTERNED_STR_KEYS = 4096
+_MAX_INTERNED_ATTRS = 4096
+
+
+@functools.lru_cache(maxsize=_MAX_INTERNED_STR_KEYS)
+def _interned_str_key(key: str) -> Key:
+  return Key(key)
+
+
+@functools.lru_cache(maxsize=_MAX_INTERNED_ATTRS)
+def _interned_attr(cls: Type[Attr], name: str) -> Attr:
+  return cls(name)
 
 
 @dataclasses.dataclass(frozen=True)
 class BuildableFnOrCls(Attr):
   """The callable (__fn_or_cls__) for a fdl.Buildable."""
+  __slots__ = ()
 
   def __init__(self):
     super().__init__("__fn_or_cls__")
@@ -226,7 +301,7 @@ register_node_traverser(
     dict,
     flatten_fn=lambda x: (tuple(x.values()), tuple(x.keys())),
     unflatten_fn=lambda values, keys: dict(zip(keys, values)),
-    path_elements_fn=lambda x: [Key(key) for key in x.keys()])
+    path_elements_fn=lambda x: [Key.get(key) for key in x.keys()])
 
 
 def flatten_defaultdict(node):
@@ -242,25 +317,26 @@ register_node_traverser(
     collections.defaultdict,
     flatten_fn=flatten_defaultdict,
     unflatten_fn=unflatten_defaultdict,
-    path_elements_fn=lambda x: tuple(Key(key) for key in x.keys()))
+    path_elements_fn=lambda x: tuple(Key.get(key) for key in x.keys()))
 
 register_node_traverser(
     tuple,
     flatten_fn=lambda x: (x, None),
     unflatten_fn=lambda x, _: tuple(x),
-    path_elements_fn=lambda x: tuple(Index(i) for i in range(len(x))))
+    path_elements_fn=lambda x: tuple(Index.get(i) for i in range(len(x))))
 
 register_node_traverser(
     NamedTupleType,
     flatten_fn=lambda x: (tuple(x), type(x)),
     unflatten_fn=lambda values, node_type: node_type(*values),
-    path_elements_fn=lambda x: tuple(Attr(name) for name in x._asdict().keys()))
+    path_elements_fn=lambda x: tuple(
+        Attr.get(name) for name in x._asdict().keys()))
 
 register_node_traverser(
     list,
     flatten_fn=lambda x: (tuple(x), None),
     unflatten_fn=lambda x, _: list(x),
-    path_elements_fn=lambda x: tuple(Index(i) for i in range(len(x))))
+    path_elements_fn=lambda x: tuple(Index.get(i) for i in range(len(x))))
 
 
 def path_str(path: Path) -> str:
@@ -526,6 +602,33 @@ def collect_value_by_path(structure: Any,
   return value_by_path
 
 
+def collect_value_by_id_and_path(
+    structure: Any,
+    memoizable_only: bool) -> Tuple[Dict[int, Any], Dict[Path, Any]]:
+  """Returns `(value_by_id, value_by_path)` for the values in `structure`.
+
+  Equivalent to `(collect_value_by_id(structure, memoizable_only),
+  collect_value_by_path(structure, memoizable_only))`, but only traverses
+  `structure` once.
+
+  Args:
+    structure: The structure for which the maps should be created.
+    memoizable_only: If true, then only include values `v` for which
+      `is_memoizable(v)` is true.
+  """
+  value_by_id = {}
+  value_by_path = {}
+
+  def collect_value(path: Path, value: Any):
+    if not memoizable_only or is_memoizable(value):
+      value_by_id[id(value)] = value
+      value_by_path[path] = value
+    return (yield)
+
+  traverse_with_path(collect_value, structure)
+  return value_by_id, value_by_path
+
+
 TraverseWithAllPathsFn = Callable[[Paths, Path, Any], Generator[None, Any, Any]]
 
 
@@ -16,7 +16,9 @@
 """Tests for daglish."""
 
 import collections
+import copy
 import dataclasses
+import pickle
 from typing import Any, cast, List, NamedTuple
 
 from absl.testing import absltest
@@ -41,6 +43,19 @@ class SampleTag(fdl.Tag):
   """`fdl.Tag` to use for testing."""
 
 
+@dataclasses.dataclass(frozen=True)
+class CustomPathElement(daglish.PathElement):
+  """A user-defined path element, which doesn't define `__slots__`."""
+  name: str
+
+  @property
+  def code(self) -> str:
+    return f".custom({self.name!r})"
+
+  def follow(self, container) -> Any:
+    return container.custom(self.name)
+
+
 class PathElementTest(absltest.TestCase):
 
   def test_path_fragment(self):
@@ -68,6 +83,46 @@ class PathElementTest(absltest.TestCase):
     cfg = fdl.Config(Foo)
     self.assertIs(daglish.BuildableFnOrCls().follow(cfg), Foo)
 
+  def test_interned_path_elements(self):
+    self.assertIs(daglish.Attr.get("foo"), daglish.Attr.get("foo"))
+    self.assertEqual(daglish.Attr.get("foo"), daglish.Attr("foo"))
+    self.assertIs(daglish.Index.get(3), daglish.Index.get(3))
+    self.assertEqual(daglish.Index.get(3), daglish.Index(3))
+    self.assertEqual(daglish.Index.get(10**6), daglish.Index(10**6))
+    self.assertIsNot(daglish.Index.get(1), daglish.Index.get(True))
+    self.assertIs(daglish.Index.get(True).index, True)
+    self.assertIs(daglish.Key.get("a"), daglish.Key.get("a"))
+    self.assertEqual(daglish.Key.get("a"), daglish.Key("a"))
+    self.assertIsNot(daglish.Key.get(1), daglish.Key.get(True))
+
+    # Keys come from user data, so the table of interned keys is bounded.
+    for i in range(2 * daglish._MAX_INTERNED_STR_KEYS):
+      daglish.Key.get(f"key_{i}")
+    self.assertLessEqual(daglish._interned_str_key.cache_info().currsize,
+                         daglish._MAX_INTERNED_STR_KEYS)
+    for i in range(2 * daglish._MAX_INTERNED_ATTRS):
+      daglish.Attr.get(f"attr_{i}")
+    self.assertLessEqual(daglish._interned_attr.cache_info().currsize,
+                         daglish._MAX_INTERNED_ATTRS)
+
+    buildable_attr = daglish.BuildableAttr.get("foo")
+    self.assertIsInstance(buildable_attr, daglish.BuildableAttr)
+    self.assertIs(buildable_attr, daglish.BuildableAttr.get("foo"))
+    self.assertIsNot(buildable_attr, daglish.Attr.get("foo"))
+
+  def test_copy_and_pickle_path_elements(self):
+    path = (daglish.Attr("foo"), daglish.Index(1), daglish.Key("a"),
+            daglish.BuildableAttr("bar"), daglish.BuildableFnOrCls())
+    self.assertEqual(copy.copy(path), path)
+    self.assertEqual(copy.deepcopy(path), path)
+    self.assertEqual(pickle.loads(pickle.dumps(path)), path)
+
+  def test_copy_and_pickle_custom_path_element(self):
+    element = CustomPathElement("foo")
+    self.assertEqual(copy.copy(element), element)
+    self.assertEqual(copy.deepcopy(element), element)
+    self.assertEqual(pickle.loads(pickle.dumps(element)), element)
+
   def test_follow_path(self):
     root = [
         1, {
@@ -505,6 +560,25 @@ class CollectValueByPathTest(absltest.TestCase):
     value_by_path = daglish.collect_value_by_path(tagged_value, False)
     self.assertEqual(value_by_path, expected)
 
+  def test_collect_value_by_id_and_path(self):
+    shared_config = fdl.Config(Foo, bar=1, baz=2)
+    shared_list = [[], ()]
+    cfg = fdl.Config(
+        Foo,
+        bar=(shared_list, shared_config),
+        baz=[shared_list, shared_config],
+    )
+
+    for memoizable_only in (True, False):
+      value_by_id, value_by_path = daglish.collect_value_by_id_and_path(
+          cfg, memoizable_only=memoizable_only)
+      self.assertEqual(
+          value_by_id,
+          daglish.collect_value_by_id(cfg, memoizable_only=memoizable_only))
+      self.assertEqual(
+          value_by_path,
+          daglish.collect_value_by_path(cfg, memoizable_only=memoizable_only))
+
   def test_collect_value_by_path(self):
     shared_config = fdl.Config(Foo, bar=1, baz=2)
     shared_list = [[], ()]
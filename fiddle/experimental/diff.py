@@ -16,11 +16,14 @@
 """Library for finding differences between Fiddle configurations."""
 
 import abc
+import collections
 import copy
 import dataclasses
 
-from typing import Any, Dict, Sequence, List, Tuple, Union, Set
+from typing import (Any, Dict, NamedTuple, Sequence, List, Tuple, Union,
+                    Set)
 from fiddle import config
+from fiddle import frozen_slots
 from fiddle import tagging
 from fiddle.experimental import daglish
 
@@ -30,8 +33,12 @@ class AlignmentError(ValueError):
 
 
 @dataclasses.dataclass(frozen=True)
-class Reference(object):
+class Reference(frozen_slots.FrozenWithSlots):
   """Symbolic reference to an object in a `Buildable`."""
+  # References are created in large numbers, so they use `__slots__` to keep
+  # them small.  (This can't be a `NamedTuple`, since `daglish` would then
+  # traverse it as a tuple.)
+  __slots__ = ('root', 'target')
   root: str
   target: daglish.Path
 
@@ -77,7 +84,7 @@ class Diff:
             '\n      ])')
 
 
-@dataclasses.dataclass(frozen=True)
+@dataclasses.dataclass(frozen=True, eq=False)
 class SetValue(DiffOperation):
   """Changes the target to new_value; fails if the target already has a value.
 
@@ -85,6 +92,17 @@ class SetValue(DiffOperation):
   """
   new_value: Union[Reference, Any]
 
+  # `__eq__` and `__hash__` compare `new_value` directly, rather than using
+  # the dataclass-generated methods (which build a tuple of fields).
+  def __eq__(self, other):
+    if other.__class__ is not self.__class__:
+      return NotImplemented
+    return (self.new_value is other.new_value or
+            bool(self.new_value == other.new_value))
+
+  def __hash__(self):
+    return hash(self.new_value)
+
   def apply(self, parent: Any, child: daglish.PathElement):
     """Sets `child.follow(parent)` to self.new_value."""
     if isinstance(child, daglish.Attr):
@@ -95,7 +113,7 @@ class SetValue(DiffOperation):
       raise ValueError(f'SetValue does not support {child}.')
 
 
-@dataclasses.dataclass(frozen=True)
+@dataclasses.dataclass(frozen=True, eq=False)
 class ModifyValue(DiffOperation):
   """Changes the target to new_value; fails if the target has no prior value.
 
@@ -103,6 +121,17 @@ class ModifyValue(DiffOperation):
   """
   new_value: Union[Reference, Any]
 
+  # `__eq__` and `__hash__` compare `new_value` directly, rather than using
+  # the dataclass-generated methods (which build a tuple of fields).
+  def __eq__(self, other):
+    if other.__class__ is not self.__class__:
+      return NotImplemented
+    return (self.new_value is other.new_value or
+            bool(self.new_value == other.new_value))
+
+  def __hash__(self):
+    return hash(self.new_value)
+
   def apply(self, parent: Any, child: daglish.PathElement):
     """Replaces `child.follow(parent)` with self.new_value."""
     if isinstance(child, daglish.BuildableFnOrCls):
@@ -134,15 +163,43 @@ class DeleteValue(DiffOperation):
       raise ValueError(f'DeleteValue does not support {child}.')
 
 
-@dataclasses.dataclass(frozen=True)
-class AlignedValues:
+# Cache for `_is_sequence_type`.  (`isinstance` checks against the `Sequence`
+# ABC are relatively slow, and `DiffAlignment` performs them for many pairs of
+# values.)
+_is_sequence_type_cache: Dict[type, bool] = {}
+
+
+def _is_sequence_type(value_type: type) -> bool:
+  """Returns true if `value_type` is a subclass of `Sequence`."""
+  result = _is_sequence_type_cache.get(value_type)
+  if result is None:
+    result = issubclass(value_type, Sequence)
+    _is_sequence_type_cache[value_type] = result
+  return result
+
+
+@dataclasses.dataclass(frozen=True, eq=False)
+class AlignedValues(frozen_slots.FrozenWithSlots):
   """A pair of aligned values."""
+  __slots__ = ('old_value', 'new_value')
   old_value: Any
   new_value: Any
 
+  # Aligned values are usually compared against the same objects, so check
+  # identity before falling back to (possibly deep) equality.
+  def __eq__(self, other):
+    if other.__class__ is not self.__class__:
+      return NotImplemented
+    return ((self.old_value is other.old_value or
+             bool(self.old_value == other.old_value)) and
+            (self.new_value is other.new_value or
+             bool(self.new_value == other.new_value)))
 
-@dataclasses.dataclass(frozen=True)
-class AlignedValueIds:
+  def __hash__(self):
+    return hash((self.old_value, self.new_value))
+
+
+class AlignedValueIds(NamedTuple):
   """A pair of `id`s for aligned values."""
   old_value_id: int
   new_value_id: int
@@ -176,6 +233,9 @@ class DiffAlignment:
   Note: `DiffAlignment` is not guaranteed to catch all violations of these
   restrictions, since some are difficult or expensive to detect.
   """
+  __slots__ = ('_old', '_new', '_old_name', '_new_name', '_aligned_olds',
+               '_aligned_news', '_index_by_old_id', '_index_by_new_id',
+               '_ids_of_tag_sets')
 
   def __init__(self,
                old: Any,
@@ -198,14 +258,22 @@ class DiffAlignment:
     self._new: Any = new
     self._old_name: str = old_name
     self._new_name: str = new_name
-    self._new_by_old_id: Dict[int, Any] = {}  # id(old_value) -> new_value
-    self._old_by_new_id: Dict[int, Any] = {}  # id(new_value) -> old_value
+    # Aligned values are stored as parallel lists, in the order they were
+    # aligned: `_aligned_olds[i]` is aligned with `_aligned_news[i]`.  These
+    # lists also keep the aligned values alive, which guarantees that the `id`s
+    # used as keys below can't be reused by other objects (even if `old` or
+    # `new` is modified after values are aligned).
+    self._aligned_olds: List[Any] = []
+    self._aligned_news: List[Any] = []
+    # Index of each aligned value in the lists above, keyed by `id`.
+    self._index_by_old_id: Dict[int, int] = {}
+    self._index_by_new_id: Dict[int, int] = {}
 
     # Any object that's used as the value for `TaggedValue.tags` is not
     # eligible for alignment; find these values so we can reject them.
     self._ids_of_tag_sets: Set[int] = set()
-    daglish.traverse_with_path(self._find_tag_sets, old)
-    daglish.traverse_with_path(self._find_tag_sets, new)
+    _add_tag_set_ids(old, self._ids_of_tag_sets)
+    _add_tag_set_ids(new, self._ids_of_tag_sets)
 
   @property
   def old(self) -> Any:
@@ -229,32 +297,40 @@ class DiffAlignment:
 
   def is_old_value_aligned(self, old_value):
     """Returns true if `old_value` is aligned with any value."""
-    return id(old_value) in self._new_by_old_id
+    return id(old_value) in self._index_by_old_id
 
   def is_new_value_aligned(self, new_value):
     """Returns true if `new_value` is aligned with any value."""
-    return id(new_value) in self._old_by_new_id
+    return id(new_value) in self._index_by_new_id
 
   def new_from_old(self, old_value):
     """Returns the object in `new` that is aligned with `old_value`."""
-    return self._new_by_old_id[id(old_value)]
+    return self._aligned_news[self._index_by_old_id[id(old_value)]]
 
   def old_from_new(self, new_value):
     """Returns the object in `old` that is aligned with `new_value`."""
-    return self._old_by_new_id[id(new_value)]
+    return self._aligned_olds[self._index_by_new_id[id(new_value)]]
 
   def aligned_values(self) -> List[AlignedValues]:
-    """Returns a list of `(old_value, new_value)` for all aligned values."""
+    """Returns a list of `(old_value, new_value)` for all aligned values.
+
+    Values are listed in the order in which they were aligned.
+    """
     return [
-        AlignedValues(self._old_by_new_id[id(new_value)], new_value)
-        for (old_id, new_value) in self._new_by_old_id.items()
+        AlignedValues(old_value, new_value)
+        for (old_value, new_value) in zip(self._aligned_olds,
+                                          self._aligned_news)
     ]
 
   def aligned_value_ids(self) -> List[AlignedValueIds]:
-    """Returns a list of `(id(old_val), id(new_val))` for all aligned values."""
+    """Returns a list of `(id(old_val), id(new_val))` for all aligned values.
+
+    Values are listed in the order in which they were aligned.
+    """
     return [
-        AlignedValueIds(old_id, id(new_value))
-        for (old_id, new_value) in self._new_by_old_id.items()
+        AlignedValueIds(id(old_value), id(new_value))
+        for (old_value, new_value) in zip(self._aligned_olds,
+                                          self._aligned_news)
     ]
 
   def align(self, old_value: Any, new_value: Any):
@@ -276,8 +352,11 @@ class DiffAlignment:
         are difficult or expensive to detect.
     """
     self._validate_alignment(old_value, new_value)
-    self._new_by_old_id[id(old_value)] = new_value
-    self._old_by_new_id[id(new_value)] = old_value
+    index = len(self._aligned_olds)
+    self._aligned_olds.append(old_value)
+    self._aligned_news.append(new_value)
+    self._index_by_old_id[id(old_value)] = index
+    self._index_by_new_id[id(new_value)] = index
 
   def can_align(self, old_value, new_value):
     """Returns true if `old_value` could be aligned with `new_value`."""
@@ -285,13 +364,26 @@ class DiffAlignment:
       return False
     if not daglish.is_memoizable(new_value):
       return False
-    if self.is_old_value_aligned(old_value):
+    return self._can_align_memoizable(old_value, new_value)
+
+  def _can_align_memoizable(self, old_value, new_value):
+    """Returns `can_align(old_value, new_value)` for memoizable values.
+
+    Used by callers that already know both values are memoizable (e.g., because
+    they were collected with `memoizable_only=True`).
+
+    Args:
+      old_value: A memoizable value in `old`.
+      new_value: A memoizable value in `new`.
+    """
+    if id(old_value) in self._index_by_old_id:
       return False
-    if self.is_new_value_aligned(new_value):
+    if id(new_value) in self._index_by_new_id:
       return False
-    if type(old_value) is not type(new_value):
+    value_type = type(old_value)
+    if value_type is not type(new_value):
       return False
-    if isinstance(old_value, Sequence) and len(old_value) != len(new_value):
+    if _is_sequence_type(value_type) and len(old_value) != len(new_value):
       return False
     if (id(old_value) in self._ids_of_tag_sets or
         id(new_value) in self._ids_of_tag_sets):
@@ -319,7 +411,7 @@ class DiffAlignment:
       raise AlignmentError(
           f'Aligning objects of different types is not currently '
           f'supported.  ({type(old_value)} vs {type(new_value)})')
-    if isinstance(old_value, Sequence):
+    if _is_sequence_type(type(old_value)):
       if len(old_value) != len(new_value):
         raise AlignmentError(
             f'Aligning sequences with different lengths is not '
@@ -337,7 +429,7 @@ class DiffAlignment:
   def __repr__(self):
     return (
         f'<DiffAlignment from {self._old_name!r} to ' +
-        f'{self._new_name!r}: {len(self._new_by_old_id)} object(s) aligned>')
+        f'{self._new_name!r}: {len(self._aligned_olds)} object(s) aligned>')
 
   def __str__(self):
     id_to_old_path = daglish.collect_paths_by_id(self.old, memoizable_only=True)
@@ -354,12 +446,88 @@ class DiffAlignment:
       lines.append('    (no objects aligned)')
     return 'DiffAlignment:\n' + '\n'.join(lines)
 
-  def _find_tag_sets(self, path, value):
-    """If value is a TaggedValue, then update _ids_of_tag_sets with it tags."""
-    del path  # Unused.
+
+def _add_tag_set_ids(structure: Any, ids: Set[int]):
+  """Adds `id(v.tags)` to `ids` for each TaggedValue `v` in `structure`.
+
+  Each memoizable value is visited once, even if it is reachable by multiple
+  paths.  (Unlike `daglish.traverse_with_path`, this also doesn't rebuild
+  the containers that it visits.)
+
+  Args:
+    structure: The structure to search for TaggedValues.
+    ids: The set of ids to update.
+  """
+  visited_ids = set()
+  stack = [structure]
+  while stack:
+    value = stack.pop()
+    if daglish.is_memoizable(value):
+      if id(value) in visited_ids:
+        continue
+      visited_ids.add(id(value))
     if isinstance(value, tagging.TaggedValueCls):
-      self._ids_of_tag_sets.add(id(value.tags))
-    return (yield)
+      ids.add(id(value.tags))
+    traverser = daglish.find_node_traverser(type(value))
+    if traverser is not None:
+      stack.extend(traverser.flatten(value)[0])
+
+
+def _collect_first_path_and_num_paths_by_id(
+    structure: Any) -> Tuple[Dict[int, daglish.Path], Dict[int, int]]:
+  """Returns `(first_path_by_id, num_paths_by_id)` for `structure`.
+
+  For each memoizable value `v` reachable from `structure`, if
+  `paths = daglish.collect_paths_by_id(structure, True)[id(v)]`, then
+  `first_path_by_id[id(v)] == paths[0]` and `num_paths_by_id[id(v)] ==
+  len(paths)`.  But each memoizable value is only visited once, so the cost is
+  linear in the number of values, rather than in the number of paths (which
+  can grow exponentially when values are shared).
+
+  Args:
+    structure: The structure to collect paths for.
+  """
+  first_path_by_id: Dict[int, daglish.Path] = {}
+  child_ids_by_id: Dict[int, List[int]] = {}
+
+  # Visit values in the same (pre-)order as `daglish.traverse_with_path`, so
+  # the first path to each value matches `collect_paths_by_id`.
+  stack = [((), structure)]
+  while stack:
+    path, value = stack.pop()
+    if not daglish.is_memoizable(value) or id(value) in first_path_by_id:
+      continue
+    first_path_by_id[id(value)] = path
+    child_ids = child_ids_by_id[id(value)] = []
+    traverser = daglish.find_node_traverser(type(value))
+    if traverser is not None:
+      children = list(
+          zip(traverser.path_elements(value),
+              traverser.flatten(value)[0]))
+      child_ids.extend(
+          id(child) for _, child in children if daglish.is_memoizable(child))
+      stack.extend((path + (path_element,), child)
+                   for path_element, child in reversed(children))
+
+  # Propagate path counts from parents to children in topological order.
+  num_parents_left = collections.Counter(
+      child_id for child_ids in child_ids_by_id.values()
+      for child_id in child_ids)
+  num_paths_by_id: Dict[int, int] = {}
+  ready = []
+  if daglish.is_memoizable(structure):
+    num_paths_by_id[id(structure)] = 1
+    ready.append(id(structure))
+  while ready:
+    value_id = ready.pop()
+    num_paths = num_paths_by_id[value_id]
+    for child_id in child_ids_by_id[value_id]:
+      num_paths_by_id[child_id] = num_paths_by_id.get(child_id, 0) + num_paths
+      num_parents_left[child_id] -= 1
+      if not num_parents_left[child_id]:
+        ready.append(child_id)
+
+  return first_path_by_id, num_paths_by_id
 
 
 def align_by_id(old: Any, new: Any, old_name='old', new_name='new'):
@@ -408,7 +576,10 @@ def align_heuristically(old: Any, new: Any, old_name='old', new_name='new'):
     be reached using the same path.
 
   * The third pass aligns any memoizable objects in `old` and `new` that have
-    equal values.  Note: this takes `O(size(old) * size(new))` time.
+    equal values.  Values are bucketed by type and by a structural hash (see
+    `_structural_hash`), so only values in the same bucket are compared.  In
+    the worst case (e.g., if all values are in the same bucket), this takes
+    `O(size(old) * size(new))` time.
 
   Args:
     old: The root object of the `old` structure.
@@ -421,90 +592,221 @@ def align_heuristically(old: Any, new: Any, old_name='old', new_name='new'):
   """
   # First pass: align by id.
   alignment = DiffAlignment(old, new, old_name, new_name)
-  old_by_id = daglish.collect_value_by_id(old, memoizable_only=True)
-  new_by_id = daglish.collect_value_by_id(new, memoizable_only=True)
+  old_by_id, path_to_old = daglish.collect_value_by_id_and_path(
+      old, memoizable_only=True)
+  new_by_id, path_to_new = daglish.collect_value_by_id_and_path(
+      new, memoizable_only=True)
+  # Values in `old_by_id`, `new_by_id`, `path_to_old`, and `path_to_new` are
+  # all memoizable, so we can skip those checks in `can_align`.
+  can_align = alignment._can_align_memoizable  # pylint: disable=protected-access
   for (value_id, value) in old_by_id.items():
     if value_id in new_by_id:
-      if alignment.can_align(value, value):
+      if can_align(value, value):
         alignment.align(value, value)
 
   # Second pass: align any objects that are reachable by the same path.
-  path_to_old = daglish.collect_value_by_path(old, memoizable_only=True)
-  path_to_new = daglish.collect_value_by_path(new, memoizable_only=True)
   for (path, old_value) in path_to_old.items():
     if path in path_to_new:
-      if alignment.can_align(old_value, path_to_new[path]):
+      if can_align(old_value, path_to_new[path]):
         alignment.align(old_value, path_to_new[path])
 
   # Third pass: align any objects that are equal (__eq__).
+  hash_cache: Dict[int, int] = {}
+  new_buckets: Dict[Tuple[type, int], List[Any]] = {}
+  for new_value in new_by_id.values():
+    bucket_key = (type(new_value), _structural_hash(new_value, hash_cache))
+    new_buckets.setdefault(bucket_key, []).append(new_value)
   for old_value in old_by_id.values():
-    for new_value in new_by_id.values():
-      if type(old_value) is type(new_value) and old_value == new_value:
-        if alignment.can_align(old_value, new_value):
-          alignment.align(old_value, new_value)
+    bucket_key = (type(old_value), _structural_hash(old_value, hash_cache))
+    for new_value in new_buckets.get(bucket_key, ()):
+      # `can_align` is checked first, since it is usually much cheaper than
+      # `==` (which may compare entire nested structures).
+      if can_align(old_value, new_value) and old_value == new_value:
+        alignment.align(old_value, new_value)
+        break  # `old_value` can't be aligned with anything else.
 
   return alignment
 
 
+def _structural_hash(value: Any, cache: Dict[int, int]) -> int:
+  """Returns a hash of `value` such that `a == b` implies equal hashes.
+
+  Unlike `hash`, this is defined for `Buildable`s, lists, and dicts, by
+  combining the hashes of their children (so the hash of a nested structure
+  depends on its contents).  Used by `align_heuristically` to avoid comparing
+  values that can't be equal.
+
+  Args:
+    value: The value to hash.
+    cache: Cache of structural hashes, keyed by `id`.  Only used for values
+      that are memoizable, and which must stay alive while the cache is used.
+  """
+  if isinstance(value, config.Buildable):
+    result = cache.get(id(value))
+    if result is None:
+      parameters = value.__signature__.parameters
+      argument_hashes = []
+      for name, arg in value.__arguments__.items():
+        # Arguments that are set to their default value are skipped, since
+        # `Buildable.__eq__` treats them as equal to unset arguments.
+        param = parameters.get(name)
+        if (param is not None and param.default is not param.empty and
+            _safe_equals(arg, param.default)):
+          continue
+        argument_hashes.append((name, _structural_hash(arg, cache)))
+      result = hash((_safe_hash(value.__fn_or_cls__),
+                     frozenset(argument_hashes)))
+      cache[id(value)] = result
+  elif isinstance(value, (list, tuple)):
+    result = cache.get(id(value))
+    if result is None:
+      result = hash(tuple(_structural_hash(v, cache) for v in value))
+      cache[id(value)] = result
+  elif isinstance(value, dict):
+    result = cache.get(id(value))
+    if result is None:
+      result = hash(
+          frozenset((_safe_hash(k), _structural_hash(v, cache))
+                    for k, v in value.items()))
+      cache[id(value)] = result
+  else:
+    result = _safe_hash(value)
+  return result
+
+
+def _safe_hash(value: Any) -> int:
+  """Returns `hash(value)`, or `0` if `value` is unhashable."""
+  try:
+    if isinstance(value, set):
+      return hash(frozenset(value))  # Sets can be equal to frozensets.
+    return hash(value)
+  except TypeError:
+    return 0
+
+
+def _safe_equals(a: Any, b: Any) -> bool:
+  """Returns `bool(a == b)`, or `False` if the comparison fails."""
+  try:
+    return bool(a == b)
+  except Exception:  # pylint: disable=broad-except
+    return False
+
+
+# Immutable atomic types, whose values are never memoizable (see
+# `daglish.is_memoizable`).  Subclasses of these types are not included.
+_ATOMIC_TYPES = frozenset([
+    bool, int, float, complex, str, bytes,
+    type(None), type(NotImplemented), type(Ellipsis)
+])
+
+
 class _DiffFromAlignmentBuilder:
   """Class used to build a `Diff` from a `DiffAlignment`.
 
   This private class is used to implement `build_diff_from_alignment`.
   """
+  __slots__ = ('alignment', 'changes', 'new_shared_values',
+               'first_path_by_old_id', '_ids_of_tag_sets')
+
   alignment: DiffAlignment
   changes: Dict[daglish.Path, DiffOperation]
   new_shared_values: List[Any]
-  paths_by_old_id: Dict[int, List[daglish.Path]]
+  first_path_by_old_id: Dict[int, daglish.Path]
 
   def __init__(self, alignment: DiffAlignment):
     self.changes: Dict[daglish.Path, DiffOperation] = {}
     self.new_shared_values: List[Any] = []
     self.alignment: DiffAlignment = alignment
-    self.paths_by_old_id = daglish.collect_paths_by_id(
-        alignment.old, memoizable_only=True)
+    self.first_path_by_old_id = _collect_first_path_and_num_paths_by_id(
+        alignment.old)[0]
 
     # Any object that's used as the value for `TaggedValue.tags` should not
     # be added to new_shared_values (even if the same set object is used).
     self._ids_of_tag_sets: Set[int] = set()
-    daglish.traverse_with_path(self._find_tag_sets, alignment.new)
+    _add_tag_set_ids(alignment.new, self._ids_of_tag_sets)
 
   def build_diff(self) -> Diff:
     """Returns a `Diff` between `alignment.old` and `alignment.new`."""
     if self.changes or self.new_shared_values:
       raise ValueError('build_diff should be called at most once.')
-    daglish.memoized_traverse(self.record_diffs, self.alignment.new)
+    self._record_all_diffs(self.alignment.new)
     return Diff(self.changes, tuple(self.new_shared_values))
 
-  def record_diffs(self, new_paths: daglish.Paths, new_value: Any):
-    """Daglish traversal function that records diffs to generate `new_value`.
+  def _record_all_diffs(self, new: Any) -> Any:
+    """Calls `record_diffs` for each value reachable from `new`.
+
+    This is equivalent to `daglish.memoized_traverse`, but uses an explicit
+    stack rather than recursive generators, since it is run for every value in
+    `new`.  Values are visited in the same (post-)order, and the output for each
+    memoizable value is reused if it is encountered again.
+
+    Args:
+      new: The root of the `new` structure.
+
+    Returns:
+      The output of `record_diffs` for `new`.
+    """
+    num_paths_by_new_id = _collect_first_path_and_num_paths_by_id(new)[1]
+    memo: Dict[int, Any] = {}
+
+    # Each entry of `stack` is either `(value,)`, for a value that hasn't been
+    # visited yet; or `(value, traverser, metadata, num_children)`, for a value
+    # whose children have been visited.  `outputs` holds the outputs for
+    # visited values that haven't yet been consumed by their parent.
+    stack = [(new,)]
+    outputs = []
+    while stack:
+      entry = stack.pop()
+      value = entry[0]
+      if len(entry) == 1:
+        if id(value) in memo:
+          outputs.append(memo[id(value)])
+          continue
+        traverser = daglish.find_node_traverser(type(value))
+        if traverser is not None:
+          children, metadata = traverser.flatten(value)
+          stack.append((value, traverser, metadata, len(children)))
+          stack.extend((child,) for child in reversed(children))
+          continue
+        diff_value = value
+      else:
+        _, traverser, metadata, num_children = entry
+        start = len(outputs) - num_children
+        diff_value = traverser.unflatten(outputs[start:], metadata)
+        del outputs[start:]
+
+      output = self.record_diffs(
+          num_paths_by_new_id.get(id(value), 1), value, diff_value)
+      if daglish.is_memoizable(value):
+        memo[id(value)] = output
+      outputs.append(output)
+
+    assert len(outputs) == 1
+    return outputs[0]
+
+  def record_diffs(self, num_new_paths: int, new_value: Any, diff_value: Any):
+    """Records diffs to generate `new_value`, and returns its output value.
 
     If `new_value` is not aligned with any `old_value`, and `new_value` can
-    be reached by a single path, returns `new_value` as-is.
+    be reached by a single path, returns `diff_value` as-is.
 
     If `new_value` is not aligned with any `old_value`, and `new_value` can
-    be reached by multiple paths, then adds `new_value` to
+    be reached by multiple paths, then adds `diff_value` to
     `self.new_shared_values`, and returns a reference to the new shared value.
 
     If `new_value` is aligned with any `old_value`, then updates
     `self.changes` with any changes necessary to mutate `old_value` into
-    `new_value`.
-
-    Returns a copy of `new_value`, or a `Reference` pointing at a shared copy of
-    `new_value` or an `old_value` that will be transformed into `new_value`.
+    `new_value`, and returns a reference to `old_value`.
 
     Args:
-      new_paths: The paths to a value reachable from `alignment.new`.
+      num_new_paths: The number of paths to `new_value` from `alignment.new`.
       new_value: The value reachable from `alignment.new`.
-
-    Yields:
-      None
+      diff_value: A copy of `new_value` whose children have been replaced by
+        the outputs of `record_diffs` (i.e., with shared objects replaced by
+        `Reference`s where appropriate).
     """
-    # `diff_value` is a copy of `new_value` with shared objects replaced by
-    # `Reference`s where appropriate.
-    diff_value = yield
-
     if not self.alignment.is_new_value_aligned(new_value):  # New object.
-      if len(new_paths) == 1 or not daglish.is_memoizable(new_value):
+      if num_new_paths == 1 or not daglish.is_memoizable(new_value):
         return diff_value
       elif id(new_value) in self._ids_of_tag_sets:
         return diff_value
@@ -512,12 +814,12 @@ class _DiffFromAlignmentBuilder:
         index = len(self.new_shared_values)
         self.new_shared_values.append(diff_value)
         return Reference(
-            root='new_shared_values', target=(daglish.Index(index),))
+            root='new_shared_values', target=(daglish.Index.get(index),))
     else:
       # Old object: check for modifications.  (Note: only memoizable values
       # may be aligned, so old_value must be memoizable here.)
       old_value = self.alignment.old_from_new(new_value)
-      old_path = self.paths_by_old_id[id(old_value)][0]
+      old_path = self.first_path_by_old_id[id(old_value)]
       if isinstance(new_value, config.Buildable):
         self.record_buildable_diffs(old_path, old_value, new_value, diff_value)
       elif isinstance(new_value, Dict):
@@ -536,50 +838,60 @@ class _DiffFromAlignmentBuilder:
       old_callable_path = old_path + (daglish.BuildableFnOrCls(),)
       self.changes[old_callable_path] = ModifyValue(new_value.__fn_or_cls__)
 
-    def argument_names_and_tags(value):
-      return list(value.__arguments__) + (['tags'] if isinstance(
-          value, tagging.TaggedValueCls) else [])
-
-    for name in argument_names_and_tags(old_value):
-      old_child = getattr(old_value, name)
-      old_child_path = old_path + (daglish.Attr(name),)
-      if name in argument_names_and_tags(new_value):
-        new_child = getattr(new_value, name)
-        if not ((isinstance(old_value, tagging.TaggedValueCls) and
-                 name == 'tags' and old_child == new_child) or
-                self.aligned_or_equal(old_child, new_child)):
-          self.changes[old_child_path] = ModifyValue(getattr(diff_value, name))
+    # Read arguments directly from `__arguments__`, rather than using
+    # `getattr` (which goes through `Buildable.__getattr__`).
+    old_arguments = old_value.__arguments__
+    new_arguments = new_value.__arguments__
+    diff_arguments = diff_value.__arguments__
+    changes = self.changes
+    # Paths to children are only built for children that have changed.
+    for name, old_child in old_arguments.items():
+      if name in new_arguments:
+        if not self.aligned_or_equal(old_child, new_arguments[name]):
+          old_child_path = old_path + (daglish.Attr.get(name),)
+          changes[old_child_path] = ModifyValue(diff_arguments[name])
       else:
-        self.changes[old_child_path] = DeleteValue()
-
-    for name in new_value.__arguments__:
-      if name not in old_value.__arguments__:
-        old_child_path = old_path + (daglish.Attr(name),)
-        self.changes[old_child_path] = SetValue(getattr(diff_value, name))
+        changes[old_path + (daglish.Attr.get(name),)] = DeleteValue()
+
+    # Aligned values have the same type, so `new_value` is a `TaggedValueCls`
+    # iff `old_value` is.
+    if isinstance(old_value, tagging.TaggedValueCls):
+      old_tags = old_value.tags
+      new_tags = new_value.tags
+      if not (old_tags == new_tags or
+              self.aligned_or_equal(old_tags, new_tags)):
+        old_tags_path = old_path + (daglish.Attr.get('tags'),)
+        changes[old_tags_path] = ModifyValue(diff_value.tags)
+
+    for name in new_arguments:
+      if name not in old_arguments:
+        old_child_path = old_path + (daglish.Attr.get(name),)
+        changes[old_child_path] = SetValue(diff_arguments[name])
 
   def record_dict_diffs(self, old_path: daglish.Path, old_value: Dict[Any, Any],
                         new_value: Dict[Any, Any], diff_value: Dict[Any, Any]):
     """Records changes needed to turn dict `old_value` into `new_value."""
     for key, old_child in old_value.items():
-      old_child_path = old_path + (daglish.Key(key),)
       if key in new_value:
         if not self.aligned_or_equal(old_child, new_value[key]):
+          old_child_path = old_path + (daglish.Key.get(key),)
           self.changes[old_child_path] = ModifyValue(diff_value[key])
       else:
-        self.changes[old_child_path] = DeleteValue()
+        self.changes[old_path + (daglish.Key.get(key),)] = DeleteValue()
 
     for key in new_value:
       if key not in old_value:
-        old_child_path = old_path + (daglish.Key(key),)
+        old_child_path = old_path + (daglish.Key.get(key),)
         self.changes[old_child_path] = SetValue(diff_value[key])
 
   def record_sequence_diffs(self, old_path: daglish.Path,
                             old_value: Sequence[Any], new_value: Sequence[Any],
                             diff_value: Sequence[Any]):
     """Records changes needed to turn sequence `old_value` into `new_value."""
-    for index, old_child in enumerate(old_value):
-      old_child_path = old_path + (daglish.Index(index),)
-      if not self.aligned_or_equal(old_child, new_value[index]):
+    aligned_or_equal = self.aligned_or_equal
+    for index, (old_child, new_child) in enumerate(zip(old_value, new_value)):
+      if not aligned_or_equal(old_child, new_child):
+        old_child_path = old_path + (daglish.Index.get(index),)
         self.changes[old_child_path] = ModifyValue(diff_value[index])
 
   def aligned_or_equal(self, old_value: Any, new_value: Any) -> bool:
@@ -593,6 +905,15 @@ class _DiffFromAlignmentBuilder:
       old_value: A value reachable from `self.alignment.old`.
       new_value: A value reachable from `self.alignment.new`.
     """
+    # Fast path for the most common leaf values.  These can't be aligned (since
+    # they're not memoizable), so they're only aligned_or_equal with an equal
+    # value of the same type.
+    if type(old_value) in _ATOMIC_TYPES:
+      return type(new_value) is type(old_value) and (old_value is new_value or
+                                                     old_value == new_value)
+    # Note: `old_value is new_value` does *not* imply that memoizable values
+    # are aligned (e.g., if a shared value was deliberately left unaligned), so
+    # the identity fast path only applies to non-memoizable values.
     if daglish.is_memoizable(new_value) or daglish.is_memoizable(old_value):
       return (self.alignment.is_old_value_aligned(old_value) and
               self.alignment.new_from_old(old_value) is new_value)
@@ -603,13 +924,6 @@ class _DiffFromAlignmentBuilder:
     else:
       return old_value == new_value
 
-  def _find_tag_sets(self, path, value):
-    """If value is a TaggedValue, then update _ids_of_tag_sets with it tags."""
-    del path  # Unused.
-    if isinstance(value, tagging.TaggedValueCls):
-      self._ids_of_tag_sets.add(id(value.tags))
-    return (yield)
-
 
 def build_diff_from_alignment(alignment: DiffAlignment) -> Diff:
   """Returns a `Diff` with the changes from `alignment.old` to `alignment.new`.
@@ -15,9 +15,14 @@
 
 """Tests for fiddle.diff."""
 
+import collections
 import copy
 import dataclasses
+import functools
+import gc
+import pickle
 from typing import Any
+import weakref
 from absl.testing import absltest
 import fiddle as fdl
 from fiddle import tagging
@@ -62,9 +67,11 @@ class BlueTag(tagging.Tag):
   """Fiddle tag for testing."""
 
 
-# Helper functions to make expected Paths easier to write (and read).
-parse_path = testing.parse_path
-parse_reference = testing.parse_reference
+# Helper functions to make expected Paths easier to write (and read).  The
+# same strings are parsed by many tests, and the results are immutable, so they
+# are cached.
+parse_path = functools.lru_cache(maxsize=None)(testing.parse_path)
+parse_reference = functools.lru_cache(maxsize=None)(testing.parse_reference)
 
 
 @dataclasses.dataclass(frozen=True)
@@ -75,6 +82,25 @@ class UnsupportedPathElement(daglish.PathElement):
 
 class DiffAlignmentTest(absltest.TestCase):
 
+  def check_aligned_values(self, alignment, expected_aligned_values):
+    """Checks that `alignment` aligns exactly the expected value pairs.
+
+    Values are compared by id, so this is cheap even for large structures.
+
+    Args:
+      alignment: The `DiffAlignment` to check.
+      expected_aligned_values: List of `AlignedValues`, in any order.
+    """
+    actual = collections.Counter(
+        (id(v.old_value), id(v.new_value))
+        for v in alignment.aligned_values())
+    expected = collections.Counter(
+        (id(v.old_value), id(v.new_value)) for v in expected_aligned_values)
+    if actual != expected:
+      self.assertCountEqual(alignment.aligned_values(),
+                            expected_aligned_values)
+      self.fail(f'Aligned value ids differ: {actual} != {expected}')
+
   def test_constructor(self):
     old = fdl.Config(make_pair, fdl.Config(SimpleClass, 1, 2, 3),
                      fdl.Config(basic_fn, 4, 5, 6))
@@ -121,7 +147,7 @@ class DiffAlignmentTest(absltest.TestCase):
           diff.AlignedValueIds(id(old.first), id(new.first)),
           diff.AlignedValueIds(id(old.first.z), id(new.second.z)),
       ]
-      self.assertCountEqual(aligned_value_ids, expected_aligned_value_ids)
+      self.assertEqual(aligned_value_ids, expected_aligned_value_ids)
 
     with self.subTest('aligned_values'):
       aligned_values = alignment.aligned_values()
@@ -130,8 +156,6 @@ class DiffAlignmentTest(absltest.TestCase):
           diff.AlignedValues(old.first, new.first),
           diff.AlignedValues(old.first.z, new.second.z),
       ]
-      aligned_values.sort(key=lambda p: id(p.old_value))
-      expected_aligned_values.sort(key=lambda p: id(p.old_value))
       self.assertEqual(aligned_values, expected_aligned_values)
 
     with self.subTest('__repr__'):
@@ -169,6 +193,18 @@ class DiffAlignmentTest(absltest.TestCase):
           'Values of type .* may only be aligned if they are equal'):
         alignment.align(old[0], new[0])
 
+  def test_alignment_keeps_aligned_values_alive(self):
+    old = [SimpleClass(1, 2, 3)]
+    new = [SimpleClass(1, 2, 3)]
+    alignment = diff.DiffAlignment(old, new)
+    alignment.align(old[0], new[0])
+    old_value_ref = weakref.ref(old[0])
+    old[0] = None
+    gc.collect()
+    self.assertIsNotNone(old_value_ref())
+    self.assertTrue(alignment.is_old_value_aligned(old_value_ref()))
+    self.assertIs(alignment.old_from_new(new[0]), old_value_ref())
+
   def test_alignment_errors(self):
     old = fdl.Config(make_pair, fdl.Config(SimpleClass, [1], [2], [3]),
                      fdl.Config(basic_fn, 4, 5, 6))
@@ -219,7 +255,7 @@ class DiffAlignmentTest(absltest.TestCase):
     new = fdl.Config(make_pair, old.first,
                      fdl.Partial(SimpleClass, z=old.first.z))
     alignment = diff.align_by_id(old, new)
-    self.assertCountEqual(alignment.aligned_values(), [
+    self.check_aligned_values(alignment, [
         diff.AlignedValues(old.first.z, new.second.z),
         diff.AlignedValues(old.first, new.first),
     ])
@@ -238,8 +274,8 @@ class DiffAlignmentTest(absltest.TestCase):
         second=fdl.Partial(basic_fn, arg1=[set([8])], arg2=[3, 4], kwarg1=d),
         third=[[1, 2], 2, [3, 4]])
     alignment = diff.align_heuristically(old, new)
-    self.assertCountEqual(
-        alignment.aligned_values(),
+    self.check_aligned_values(
+        alignment,
         [
             # Values aligned by id:
             diff.AlignedValues(old.second.kwarg1, new.first.arg2),
@@ -251,6 +287,44 @@ class DiffAlignmentTest(absltest.TestCase):
             diff.AlignedValues(old.first.z, new.second.arg2),
         ])
 
+  def test_align_heuristically_by_equality(self):
+    old = fdl.Config(
+        SimpleClass,
+        x=[fdl.Config(SimpleClass, x=1), fdl.Config(basic_fn, arg1=1)],
+        y=[fdl.Config(SimpleClass, x=2), fdl.Config(SimpleClass, x=2)])
+    new = fdl.Config(
+        SimpleClass,
+        z=[fdl.Config(basic_fn, arg1=1), fdl.Config(SimpleClass, x=1)],
+        y=[[fdl.Config(SimpleClass, x=2), fdl.Config(SimpleClass, x=2)]])
+    alignment = diff.align_heuristically(old, new)
+    self.check_aligned_values(
+        alignment,
+        [
+            # Values aligned by path:
+            diff.AlignedValues(old, new),
+            # Values aligned by equality:
+            diff.AlignedValues(old.x[0], new.z[1]),
+            diff.AlignedValues(old.x[1], new.z[0]),
+            diff.AlignedValues(old.y, new.y[0]),
+            diff.AlignedValues(old.y[0], new.y[0][0]),
+            diff.AlignedValues(old.y[1], new.y[0][1]),
+        ])
+
+  def test_align_heuristically_by_equality_with_defaults(self):
+    # Arguments that are explicitly set to their default value are equal to
+    # unset arguments.
+    old = fdl.Config(
+        SimpleClass,
+        x=[fdl.Config(basic_fn, 1, 2, kwarg1=0), fdl.Config(basic_fn, 1, 3)])
+    new = fdl.Config(
+        SimpleClass,
+        y=[fdl.Config(basic_fn, 1, 2), fdl.Config(basic_fn, 1, 3, kwarg2=5)])
+    alignment = diff.align_heuristically(old, new)
+    self.check_aligned_values(alignment, [
+        diff.AlignedValues(old, new),
+        diff.AlignedValues(old.x[0], new.y[0]),
+    ])
+
 
 class ReferenceTest(absltest.TestCase):
 
@@ -259,6 +333,12 @@ class ReferenceTest(absltest.TestCase):
         'old', (daglish.Attr('foo'), daglish.Index(1), daglish.Key('bar')))
     self.assertEqual(repr(reference), "<Reference: old.foo[1]['bar']>")
 
+  def test_copy_and_pickle(self):
+    reference = diff.Reference(
+        'old', (daglish.Attr('foo'), daglish.Index(1), daglish.Key('bar')))
+    self.assertEqual(copy.deepcopy(reference), reference)
+    self.assertEqual(pickle.loads(pickle.dumps(reference)), reference)
+
 
 class DiffTest(absltest.TestCase):
 
@@ -466,6 +546,19 @@ class DiffFromAlignmentBuilderTest(absltest.TestCase):
     }
     self.check_diff(old, new, expected_changes, expected_new_shared_values)
 
+  def test_collect_first_path_and_num_paths_by_id(self):
+    shared = [1, 2]
+    nested = fdl.Config(SimpleClass, x=shared, y=[shared], z=())
+    structure = fdl.Config(make_pair, first=nested, second=[nested, shared])
+    first_path_by_id, num_paths_by_id = (
+        diff._collect_first_path_and_num_paths_by_id(structure))
+    paths_by_id = daglish.collect_paths_by_id(structure, memoizable_only=True)
+    self.assertEqual(first_path_by_id,
+                     {key: paths[0] for key, paths in paths_by_id.items()})
+    self.assertEqual(num_paths_by_id,
+                     {key: len(paths) for key, paths in paths_by_id.items()})
+    self.assertEqual(num_paths_by_id[id(shared)], 5)
+
   def test_multiple_modifications(self):
     cfg_diff = self.make_test_diff_builder().build_diff()
     expected_changes = {
@@ -587,6 +680,20 @@ class DiffFromAlignmentBuilderTest(absltest.TestCase):
     self.assertFalse(
         diff_builder.aligned_or_equal(old.first.z[1], new.first.kwarg2))
 
+  def test_aligned_or_equal_identical_values(self):
+    shared = [1]
+    old = fdl.Config(SimpleClass, x=shared, y='abc')
+    new = fdl.Config(SimpleClass, x=shared, y='abc')
+    diff_builder = diff._DiffFromAlignmentBuilder(diff.DiffAlignment(old, new))
+
+    # Identical non-memoizable values are equal.
+    self.assertTrue(diff_builder.aligned_or_equal(old.y, new.y))
+    # But identical memoizable values are only aligned_or_equal if they have
+    # actually been aligned.
+    self.assertFalse(diff_builder.aligned_or_equal(old.x, new.x))
+    diff_builder.alignment.align(old.x, new.x)
+    self.assertTrue(diff_builder.aligned_or_equal(old.x, new.x))
+
   def test_replace_set(self):
     self.check_diff([set([5])], [set([6])],
                     expected_changes={
@@ -596,38 +703,40 @@ class DiffFromAlignmentBuilderTest(absltest.TestCase):
 
 class ResolveDiffReferencesTest(absltest.TestCase):
 
+  # Paths and references used by many of the tests below.
+  Z_PATH = parse_path('.z')
+  SHARED_0 = parse_reference('new_shared_values', '[0]')
+
   def test_resolve_ref_from_change_to_old(self):
     old = fdl.Config(SimpleClass, x=[1])
     cfg_diff = diff.Diff(
-        changes={parse_path('.z'): diff.SetValue(parse_reference('old', '.x'))})
+        changes={self.Z_PATH: diff.SetValue(parse_reference('old', '.x'))})
     resolved_diff = diff.resolve_diff_references(cfg_diff, old)
-    diff_z = resolved_diff.changes[parse_path('.z')]
+    diff_z = resolved_diff.changes[self.Z_PATH]
     self.assertIsInstance(diff_z, diff.SetValue)
     self.assertIs(diff_z.new_value, old.x)
 
   def test_resolve_ref_from_change_to_new_shared_value(self):
     old = fdl.Config(SimpleClass, x=[1])
     changes = {
-        parse_path('.z'):
-            diff.SetValue(parse_reference('new_shared_values', '[0]'))
+        self.Z_PATH: diff.SetValue(self.SHARED_0)
     }
     new_shared_values = ([1],)
     cfg_diff = diff.Diff(changes, new_shared_values)
     resolved_diff = diff.resolve_diff_references(cfg_diff, old)
-    diff_z = resolved_diff.changes[parse_path('.z')]
+    diff_z = resolved_diff.changes[self.Z_PATH]
     self.assertIsInstance(diff_z, diff.SetValue)
     self.assertIs(diff_z.new_value, resolved_diff.new_shared_values[0])
 
   def test_resolve_ref_from_new_shared_value_to_old(self):
     old = fdl.Config(SimpleClass, x=[1])
     changes = {
-        parse_path('.z'):
-            diff.SetValue(parse_reference('new_shared_values', '[0]')),
+        self.Z_PATH: diff.SetValue(self.SHARED_0),
     }
     new_shared_values = ([parse_reference('old', '.x')],)
     cfg_diff = diff.Diff(changes, new_shared_values)
     resolved_diff = diff.resolve_diff_references(cfg_diff, old)
-    diff_z = resolved_diff.changes[parse_path('.z')]
+    diff_z = resolved_diff.changes[self.Z_PATH]
     self.assertIsInstance(diff_z, diff.SetValue)
     self.assertIs(diff_z.new_value, resolved_diff.new_shared_values[0])
     self.assertIs(resolved_diff.new_shared_values[0][0], old.x)
@@ -635,16 +744,16 @@ class ResolveDiffReferencesTest(absltest.TestCase):
   def test_resolve_ref_from_new_shared_value_to_new_shared_value(self):
     old = fdl.Config(SimpleClass, x=[1])
     changes = {
-        parse_path('.z'):
+        self.Z_PATH:
             diff.SetValue([
-                parse_reference('new_shared_values', '[0]'),
+                self.SHARED_0,
                 parse_reference('new_shared_values', '[1]')
             ])
     }
-    new_shared_values = ([1], [parse_reference('new_shared_values', '[0]')])
+    new_shared_values = ([1], [self.SHARED_0])
     cfg_diff = diff.Diff(changes, new_shared_values)
     resolved_diff = diff.resolve_diff_references(cfg_diff, old)
-    diff_z = resolved_diff.changes[parse_path('.z')]
+    diff_z = resolved_diff.changes[self.Z_PATH]
     self.assertIsInstance(diff_z, diff.SetValue)
     self.assertIs(diff_z.new_value[0], resolved_diff.new_shared_values[0])
     self.assertIs(diff_z.new_value[1], resolved_diff.new_shared_values[1])
@@ -662,15 +771,15 @@ class ResolveDiffReferencesTest(absltest.TestCase):
             parse_path("[1]['z']"):
                 diff.SetValue(parse_reference('old', '[2]')),
             parse_path('[2].x'):
-                diff.SetValue(parse_reference('new_shared_values', '[0]')),
+                diff.SetValue(self.SHARED_0),
             parse_path('[2].y'):
-                diff.SetValue(parse_reference('new_shared_values', '[0]')),
+                diff.SetValue(self.SHARED_0),
             parse_path('[2].z'):
                 diff.ModifyValue(parse_reference('new_shared_values', '[1]')),
         },
         new_shared_values=([parse_reference('old', '[3]')], [
             parse_reference('old', '[0]'),
-            parse_reference('new_shared_values', '[0]')
+            self.SHARED_0
         ]),
     )
     resolved_diff = diff.resolve_diff_references(cfg_diff, old)
@@ -702,7 +811,7 @@ class ResolveDiffReferencesTest(absltest.TestCase):
   def test_error_unexpected_reference_root(self):
     old = fdl.Config(SimpleClass, x=[1])
     cfg_diff = diff.Diff(
-        changes={parse_path('.z'): diff.SetValue(parse_reference('foo', '.x'))})
+        changes={self.Z_PATH: diff.SetValue(parse_reference('foo', '.x'))})
     with self.assertRaisesRegex(ValueError, 'Unexpected Reference.root'):
       diff.resolve_diff_references(cfg_diff, old)
 
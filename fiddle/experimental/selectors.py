@@ -20,7 +20,7 @@ of base configuration, and these APIs allow such overrides to take place
 imperatively.
 """
 
-from typing import Any, Callable, Iterator, Optional, Set, Type, Union
+from typing import Any, Callable, Dict, Iterator, Optional, Set, Type, Union
 
 from fiddle import config
 from fiddle import tagging
@@ -46,6 +46,9 @@ class Selection:
   tag: Optional[tagging.TagType]
   match_subclasses: bool
   buildable_type: Type[config.Buildable]
+  _match_fn_or_cls_subclasses: bool
+  _is_subclass_cache: Dict[type, bool]
+  _is_subtag_cache: Dict[tagging.TagType, bool]
 
   def __init__(
       self,
@@ -60,6 +63,17 @@ class Selection:
     super().__setattr__("fn_or_cls", fn_or_cls)
     super().__setattr__("tag", tag)
     super().__setattr__("match_subclasses", match_subclasses)
+    # Whether `_matches` should check if `__fn_or_cls__` is a subclass of
+    # `fn_or_cls`.  This only depends on the selection, so it's computed once
+    # here, rather than for each node.  (We check whether `fn_or_cls` is a
+    # `type` to avoid `issubclass` errors when it's actually a function.)
+    super().__setattr__("_match_fn_or_cls_subclasses", match_subclasses and
+                        isinstance(fn_or_cls, type))
+    # Cached results of `issubclass(t, fn_or_cls)`, keyed by `t`.  Configs
+    # typically contain many nodes with the same `__fn_or_cls__`.
+    super().__setattr__("_is_subclass_cache", {})
+    # Cached results of `issubclass(t, tag)`, keyed by the tag `t`.
+    super().__setattr__("_is_subtag_cache", {})
 
     if buildable_type is None:
       # Set `buildable_type` for implementation in `_matches` below. In general
@@ -81,7 +95,7 @@ class Selection:
     if self.tag is not None:
       if not isinstance(node, tagging.TaggedValueCls):
         return False
-      if not any(issubclass(tag, self.tag) for tag in node.tags):
+      if not any(self._is_subtag(tag) for tag in node.tags):
         return False
       node = node.value
 
@@ -92,39 +106,63 @@ class Selection:
     if self.fn_or_cls is not None:
       if self.fn_or_cls != node.__fn_or_cls__:
         # Determines if subclass matching is allowed, and if the node is a
-        # subclass of `self.fn_or_cls`. We check whether both are instances
-        # of `type` to avoid `issubclass` errors when either side is actually a
+        # subclass of `self.fn_or_cls`. We check whether `__fn_or_cls__` is an
+        # instance of `type` to avoid `issubclass` errors when it is actually a
         # function.
         is_subclass = (
-            self.match_subclasses  #
-            and isinstance(self.fn_or_cls, type)  #
+            self._match_fn_or_cls_subclasses  #
             and isinstance(node.__fn_or_cls__, type)  #
-            and issubclass(node.__fn_or_cls__, self.fn_or_cls))
+            and self._is_subclass(node.__fn_or_cls__))
         if not is_subclass:
           return False
 
     return True
 
-  def _iter_helper(self, node: config.Buildable, seen: Set[int]):
-    """Helper for __iter__ function below, keeping track of seen nodes."""
-    if id(node) in seen:
-      return
-    seen.add(id(node))
-
-    if self._matches(node):
-      yield node
-
-    for leaf in tree.flatten(node.__arguments__):
-      if isinstance(leaf, config.Buildable):
-        yield from self._iter_helper(leaf, seen)
+  def _is_subclass(self, node_type: type) -> bool:
+    """Returns `issubclass(node_type, self.fn_or_cls)`, using a cache."""
+    result = self._is_subclass_cache.get(node_type)
+    if result is None:
+      result = issubclass(node_type, self.fn_or_cls)
+      self._is_subclass_cache[node_type] = result
+    return result
+
+  def _is_subtag(self, tag: tagging.TagType) -> bool:
+    """Returns `issubclass(tag, self.tag)`, using a cache."""
+    result = self._is_subtag_cache.get(tag)
+    if result is None:
+      result = issubclass(tag, self.tag)
+      self._is_subtag_cache[tag] = result
+    return result
 
   def __iter__(self) -> Iterator[config.Buildable]:
     """Iterates over nodes in the tree.
 
-    Returns:
+    Nodes are visited in depth-first pre-order, and each node is visited once,
+    even if it is reachable by multiple paths.  This uses an explicit stack
+    (rather than recursion), so deep configurations don't need a generator
+    frame per level.
+
+    Yields:
       config.Buildable nodes matching this selection.
     """
-    return self._iter_helper(self.cfg, set())
+    matches = self._matches
+    seen: Set[int] = set()
+    stack = [self.cfg]
+    while stack:
+      node = stack.pop()
+      if id(node) in seen:
+        continue
+      seen.add(id(node))
+
+      if matches(node):
+        yield node
+
+      # Children are found after `node` is yielded, so they reflect any changes
+      # made to `node` by the caller.  They're pushed in reverse, so they're
+      # popped (and visited) in order.
+      stack.extend(
+          leaf for leaf in reversed(tree.flatten(node.__arguments__))
+          if isinstance(leaf, config.Buildable))
 
   def __setattr__(self, name: str, value: Any) -> None:
     """Shorthand to set a single value.
@@ -28,6 +28,14 @@ def fake_init_fn(rng, shape, dtype):
   return 1234
 
 
+class DType(fdl.Tag):
+  """Tag for dtypes."""
+
+
+class ActivationDType(DType):
+  """Tag for activation dtypes (example sub-tag)."""
+
+
 @dataclasses.dataclass
 class Attention:
   dtype: Any
@@ -130,6 +138,18 @@ class SelectionTest(absltest.TestCase):
     # The shared kernel init node is only visited once.
     self.assertLen(list(selectors.select(cfg, fake_init_fn)), 1)
 
+  def test_select_by_tag(self):
+    cfg = fdl.Config(
+        Mlp, dtype=ActivationDType.new("float32"), use_bias=DType.new(False))
+
+    # Matches sub-tags.
+    self.assertLen(list(selectors.select(cfg, tag=DType)), 2)
+    self.assertLen(list(selectors.select(cfg, tag=ActivationDType)), 1)
+
+    selectors.select(cfg, tag=ActivationDType).value = "bfloat16"
+    self.assertEqual(cfg.dtype.value, "bfloat16")
+    self.assertEqual(cfg.use_bias.value, False)
+
   def test_setattr(self):
     cfg = encoder_decoder_config()
     selectors.select(cfg, Attention).dtype = "override_dtype"
@@ -100,15 +100,21 @@ def convert_jnp_device_array_to_ast(value, convert_child):
       ])
 
 
+# Whether `enable` has already been called.
+_enabled = False
+
+
 def enable():
   """Registers JAX fiddle extensions.
 
-  This allows for things like nicer handling of jax.numpy dtypes.
+  This allows for things like nicer handling of jax.numpy dtypes.  Calling
+  `enable` more than once has no further effect.
   """
-  for value, importable in _jnp_type_importables:
-    special_value_codegen.register_exact_value(value, importable)
+  global _enabled
+  if _enabled:
+    return
 
-  for value, importable in _nn_type_importables:
+  for value, importable in _jnp_type_importables + _nn_type_importables:
     special_value_codegen.register_exact_value(value, importable)
 
   for module_str, import_stmt in _import_aliases:
@@ -118,3 +124,5 @@ def enable():
   # that register_converter is usually a decorator, but we call it directly.
   py_val_to_ast_converter.register_py_val_to_ast_converter(is_jnp_device_array)(
       convert_jnp_device_array_to_ast)
+
+  _enabled = True
@@ -0,0 +1,38 @@
+# coding=utf-8
+# Copyright 2022 The Fiddle-Config Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Support for frozen dataclasses that define `__slots__`.
+
+This module has no dependencies, so that it can be used by both history.py and
+the daglish and diff libraries.
+"""
+
+
+class FrozenWithSlots:
+  """Base class for frozen dataclasses that define `__slots__`.
+
+  The default handling of slot state by `copy` and `pickle` uses `setattr`,
+  which frozen dataclasses don't allow, so this restores state with
+  `object.__setattr__` instead.
+  """
+  __slots__ = ()
+
+  def __setstate__(self, state):
+    # Subclasses without `__slots__` pickle their `__dict__` alone, rather than
+    # a `(dict_state, slot_state)` tuple.
+    dict_state, slot_state = state if isinstance(state, tuple) else (state, None)
+    for partial_state in (dict_state, slot_state):
+      for name, value in (partial_state or {}).items():
+        object.__setattr__(self, name, value)
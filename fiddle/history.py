@@ -35,44 +35,72 @@ The history functionality has a few bits of non-trivial logic:
 import contextlib
 import dataclasses
 import itertools
-import traceback
-from typing import Any, Callable, Iterator, Optional, Union
+import sys
+from typing import Any, Callable, ContextManager, Iterator, Optional, Union
+
+from fiddle import frozen_slots
 
 # An incrementing counter to allow for time-travel debugging.
 _set_counter = itertools.count()
 
 
-@dataclasses.dataclass(frozen=True)
-class Location:
+@dataclasses.dataclass(frozen=True, init=False)
+class Location(frozen_slots.FrozenWithSlots):
   """Information about where a parameter was set."""
+  # Locations (and history entries) are created for every parameter that is
+  # set, so they use `__slots__` to keep them small.
+  __slots__ = ("filename", "line_number", "function_name")
   filename: str
   line_number: int
   function_name: Optional[str]
 
+  def __init__(self, filename: str, line_number: int,
+               function_name: Optional[str]):
+    # Sets the slots directly, which is faster than the `object.__setattr__`
+    # calls in a generated frozen dataclass `__init__`.
+    _set_location_filename(self, filename)
+    _set_location_line_number(self, line_number)
+    _set_location_function_name(self, function_name)
+
   def __str__(self) -> str:
     if self.function_name is None:
       return f"{self.filename}:{self.line_number}"
     return f"{self.filename}:{self.line_number}:{self.function_name}"
 
 
+_set_location_filename = Location.filename.__set__
+_set_location_line_number = Location.line_number.__set__
+_set_location_function_name = Location.function_name.__set__
+
 # A function that returns a location.
 LocationProvider = Callable[[], Location]
 
 
+# Files whose frames are skipped when finding the user code that set a field.
+_SKIPPED_FILENAME_SUFFIXES = ("fiddle/config.py", "fiddle/history.py",
+                              "fiddle/materialize.py")
+
+
 def _stacktrace_location_provider() -> Location:
   """Returns a string corresponding to the user-function that set the field.
 
+  This walks the stack frames directly (rather than using
+  `traceback.extract_stack`), since it's called for every history entry, and
+  only needs a single frame.  In particular, it avoids formatting a summary
+  (and loading the source line) of every frame in the stack.
+
   Raises:
     RuntimeError: if no suitable stack frame can be found.
   """
-  for frame in reversed(traceback.extract_stack()):
-    if (not frame.filename.endswith("fiddle/config.py") and
-        not frame.filename.endswith("fiddle/history.py") and
-        not frame.filename.endswith("fiddle/materialize.py")):
+  frame = sys._getframe()  # pylint: disable=protected-access
+  while frame is not None:
+    filename = frame.f_code.co_filename
+    if not filename.endswith(_SKIPPED_FILENAME_SUFFIXES):
       return Location(
-          filename=frame.filename,
-          line_number=frame.lineno,
-          function_name=frame.name)
+          filename=filename,
+          line_number=frame.f_lineno,
+          function_name=frame.f_code.co_name)
+    frame = frame.f_back
   raise RuntimeError("Cannot find a suitable frame in the stack trace!")
 
 
@@ -89,8 +117,8 @@ class _Sentinel:
 DELETED = _Sentinel()
 
 
-@dataclasses.dataclass(frozen=True)
-class HistoryEntry:
+@dataclasses.dataclass(frozen=True, init=False)
+class HistoryEntry(frozen_slots.FrozenWithSlots):
   """An entry in the history table for a config object.
 
   Attributes:
@@ -101,11 +129,26 @@ class HistoryEntry:
       `del`d.
     location: The location in user code that made the modification.
   """
+  __slots__ = ("sequence_id", "param_name", "value", "location")
   sequence_id: int
   param_name: str
   value: Union[Any, _Sentinel]
   location: Location
 
+  def __init__(self, sequence_id: int, param_name: str,
+               value: Union[Any, _Sentinel], location: Location):
+    # Sets the slots directly (see `Location.__init__`).
+    _set_entry_sequence_id(self, sequence_id)
+    _set_entry_param_name(self, param_name)
+    _set_entry_value(self, value)
+    _set_entry_location(self, location)
+
+
+_set_entry_sequence_id = HistoryEntry.sequence_id.__set__
+_set_entry_param_name = HistoryEntry.param_name.__set__
+_set_entry_value = HistoryEntry.value.__set__
+_set_entry_location = HistoryEntry.location.__set__
+
 
 def entry(param_name: str, value: Union[_Sentinel, Any]) -> HistoryEntry:
   """Returns a newly constructed history entry.
@@ -146,5 +189,33 @@ def custom_location(
   global _location_provider
   original_location_provider = _location_provider
   _location_provider = temporary_provider
-  yield temporary_provider
-  _location_provider = original_location_provider
+  try:
+    yield temporary_provider
+  finally:
+    _location_provider = original_location_provider
+
+
+# The location recorded for history entries while location capture is
+# disabled.
+UNCAPTURED_LOCATION = Location(
+    filename="<location not captured>", line_number=0, function_name=None)
+
+
+def disable_location_capture() -> ContextManager[LocationProvider]:
+  """Temporarily disables capturing locations for history entries.
+
+  Inside the `with` block, new history entries record `UNCAPTURED_LOCATION`
+  instead of inspecting the stack.  This can be used to speed up code that
+  builds large configs programmatically, when the location of each change
+  isn't needed.
+
+  Example usage:
+  ```py
+  with disable_location_capture():
+    my_config = build_large_config()
+  ```
+
+  Returns:
+    A context manager that sets the location provider for its duration.
+  """
+  return custom_location(lambda: UNCAPTURED_LOCATION)
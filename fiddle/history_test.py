@@ -15,6 +15,8 @@
 
 """Tests for history."""
 
+import copy
+import pickle
 from absl.testing import absltest
 from fiddle import history
 
@@ -41,6 +43,12 @@ class HistoryTest(absltest.TestCase):
     self.assertEqual(entry.param_name, "y")
     self.assertEqual(entry.value, history.DELETED)
 
+  def test_copy_and_pickle_entry(self):
+    entry = history.entry("x", [1, 2])
+    self.assertEqual(copy.copy(entry), entry)
+    self.assertEqual(copy.deepcopy(entry), entry)
+    self.assertEqual(pickle.loads(pickle.dumps(entry)), entry)
+
   def test_location_provider(self):
     entry = history.entry("x", 123)
     self.assertRegex(entry.location.filename, "history_test.py")
@@ -67,6 +75,22 @@ class HistoryTest(absltest.TestCase):
     self.assertEqual(e2.location.function_name, "foo")
     self.assertEqual(e3.location.function_name, "test_custom_location_provider")
 
+  def test_disable_location_capture(self):
+    with history.disable_location_capture():
+      e1 = history.entry("x", 1)
+    e2 = history.entry("y", 2)
+
+    self.assertIs(e1.location, history.UNCAPTURED_LOCATION)
+    self.assertRegex(e2.location.filename, "history_test.py")
+
+  def test_disable_location_capture_restores_on_error(self):
+    with self.assertRaises(ValueError):
+      with history.disable_location_capture():
+        raise ValueError("oops")
+    entry = history.entry("x", 1)
+
+    self.assertRegex(entry.location.filename, "history_test.py")
+
 
 if __name__ == "__main__":
   absltest.main()
@@ -60,7 +60,7 @@ with the value.
 from __future__ import annotations
 
 import inspect
-from typing import Any, Collection, FrozenSet, Generic, Optional, Set, TypeVar, Union
+from typing import Any, Collection, FrozenSet, Generic, Mapping, Optional, Set, TypeVar, Union
 
 from fiddle import config
 from fiddle import tag_type
@@ -86,6 +86,9 @@ class _NoValue:
 
 NO_VALUE = _NoValue()
 
+# Sentinel for arguments that don't match any tag in `set_tagged_values`.
+_NO_MATCH = object()
+
 serialization.register_node_traverser(
     _NoValue,
     flatten_fn=lambda _: ((), None),
@@ -176,18 +179,52 @@ def set_tagged(root: config.Buildable, *, tag: TagType, value: Any) -> None:
     tag: The tag to search for.
     value: Value to set for all parameters tagged with `tag`.
   """
+  set_tagged_values(root, {tag: value})
+
+
+def set_tagged_values(root: config.Buildable,
+                      values_by_tag: Mapping[TagType, Any]) -> None:
+  """Sets parameters in `root` for several tags with a single traversal.
 
-  def map_fn(unused_all_paths, node_value):
-    # Recurses, but ignores returned value, because we are mutating the
-    # config instead of returning a modified copy.
-    yield
+  This is equivalent to calling `set_tagged` once for each item of
+  `values_by_tag` (in order), but only walks `root` once. So if a parameter
+  matches more than one of the tags, it is set to the value of the last one.
+
+  Args:
+    root: The root of a DAG of Buildables.
+    values_by_tag: Mapping from tags to search for to the value to set for all
+      parameters tagged with that tag.
+  """
+  items = list(values_by_tag.items())
+
+  # Each value is visited once, even if it is reachable by multiple paths.
+  # (Unlike `daglish.memoized_traverse`, this doesn't collect every path to
+  # each value, which can be exponential in the depth of shared subgraphs.)
+  # An explicit stack is used, so deep DAGs don't hit the recursion limit.
+  visited = set()
+  stack = [root]
+  while stack:
+    node_value = stack.pop()
+    if daglish.is_memoizable(node_value):
+      if id(node_value) in visited:
+        continue
+      visited.add(id(node_value))
+    traverser = daglish.find_node_traverser(type(node_value))
+    if traverser is None:
+      continue
+    # Children are found before setting any values below, so that the new
+    # values are not traversed.
+    stack.extend(traverser.flatten(node_value)[0])
     if isinstance(node_value, config.Buildable):
       for key, tags in node_value.__argument_tags__.items():
-        if any(issubclass(t, tag) for t in tags):
-          setattr(node_value, key, value)
-    return node_value
-
-  daglish.memoized_traverse(map_fn, root)
+        new_value = _NO_MATCH
+        for tag, value in items:
+          # Tags hash by identity, so an exact match is a cheap set lookup;
+          # only fall back to scanning for subclasses when it misses.
+          if tag in tags or any(issubclass(t, tag) for t in tags):
+            new_value = value
+        if new_value is not _NO_MATCH:
+          setattr(node_value, key, new_value)
 
 
 def list_tags(
@@ -205,20 +242,17 @@ def list_tags(
     Set of tags used in this buildable.
   """
   tags = set()
-
-  def _inner(node: config.Buildable):
+  visited = set()  # Ids of visited Buildables (shared ones are visited once).
+  stack = [root]
+  while stack:
+    node = stack.pop()
+    if id(node) in visited:
+      continue
+    visited.add(id(node))
     for node_tags in node.__argument_tags__.values():
       tags.update(node_tags)
-
-    def map_fn(leaf):
-      if isinstance(leaf, config.Buildable):
-        _inner(leaf)
-      return leaf
-
-    # TODO: Use something other than map for efficiency.
-    tree.map_structure(map_fn, node.__arguments__)
-
-  _inner(root)
+    stack.extend(leaf for leaf in tree.flatten(node.__arguments__)
+                 if isinstance(leaf, config.Buildable))
 
   # Add superclasses if desired.
   if add_superclasses:
@@ -158,6 +158,20 @@ class TaggingTest(absltest.TestCase):
     tagging.set_tagged(cfg, tag=tst.ParameterDType, value=42)
     self.assertEqual(fdl.build(cfg), {"foo": 42, "bar": 42})
 
+  def test_set_tagged_values(self):
+    cfg = fdl.Config(
+        return_kwargs,
+        foo=tst.ParameterDType.new(default=None),
+        bar=tst.LinearParamDType.new(),
+        baz=tst.ActivationDType.new())
+    tagging.set_tagged_values(cfg, {
+        tst.ParameterDType: 1,
+        tst.LinearParamDType: 2,
+    })
+    self.assertEqual(cfg.foo.value, 1)
+    self.assertEqual(cfg.bar.value, 2)
+    self.assertIs(cfg.baz.value, tagging.NO_VALUE)
+
   def test_list_tags(self):
     cfg = fdl.Config(
         return_kwargs,
@@ -180,6 +194,29 @@ class TaggingTest(absltest.TestCase):
     tags = tagging.list_tags(cfg, add_superclasses=True)
     self.assertEqual(tags, {tst.ParameterDType, tst.LinearParamDType})
 
+  def test_shared_subgraphs_are_visited_once(self):
+    # A "lattice" with 2**50 paths to the innermost node; traversals that
+    # visit each path (rather than each node) would never finish.
+    cfg = fdl.Config(return_kwargs, x=tst.ParameterDType.new())
+    for _ in range(50):
+      cfg = fdl.Config(return_kwargs, left=cfg, right=cfg)
+    self.assertEqual(tagging.list_tags(cfg), {tst.ParameterDType})
+    tagging.set_tagged(cfg, tag=tst.ParameterDType, value=3)
+    innermost = cfg
+    for _ in range(50):
+      innermost = innermost.left
+    self.assertEqual(innermost.x.value, 3)
+
+  def test_deep_configs(self):
+    # Deeper than the default recursion limit.
+    cfg = fdl.Config(return_kwargs, x=tst.ParameterDType.new())
+    innermost = cfg
+    for _ in range(2000):
+      cfg = fdl.Config(return_kwargs, child=cfg)
+    self.assertEqual(tagging.list_tags(cfg), {tst.ParameterDType})
+    tagging.set_tagged(cfg, tag=tst.ParameterDType, value=3)
+    self.assertEqual(innermost.x.value, 3)
+
   def test_set_only_placeholders_in_subtree(self):
     cfg = fdl.Config(
         return_kwargs,
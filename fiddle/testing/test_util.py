@@ -23,6 +23,14 @@ from fiddle.experimental import daglish
 from fiddle.experimental import diff
 
 
+# Tokenizer for `parse_path`.  Each match is a single path element, and its
+# `lastgroup` indicates the element's kind.
+_PATH_ELEMENT_RE = re.compile(r'\.(?P<attr>\w+)|'
+                              r'\[(?P<index>\d+)\]|'
+                              r'\[(?P<key>\'[^\']*\'|\"[^\"]+\")\]|'
+                              r'(?P<error>.)')
+
+
 def parse_path(path_str: str) -> daglish.Path:
   """Builds a daglish Path from a string.
 
@@ -40,26 +48,21 @@ def parse_path(path_str: str) -> daglish.Path:
   Returns:
     A Path `p` such that `daglish.path_str(p) == path_str`.
   """
-  make_path_re = re.compile(r'\.(?P<attr>\w+)|'
-                            r'\[(?P<index>\d+)\]|'
-                            r'\[(?P<key>\'[^\']*\'|\"[^\"]+\")\]|'
-                            r'(?P<error>.)')
-
   path = []
-  for m in make_path_re.finditer(path_str):
-    if m.group('attr'):
-      if m.group('attr') == '__fn_or_cls__':
+  for m in _PATH_ELEMENT_RE.finditer(path_str):
+    kind, text = m.lastgroup, m.group(m.lastgroup)
+    if kind == 'attr':
+      if text == '__fn_or_cls__':
         path.append(daglish.BuildableFnOrCls())
       else:
-        path.append(daglish.Attr(m.group('attr')))
-    elif m.group('index'):
-      path.append(daglish.Index(int(m.group('index'))))
-    elif m.group('key'):
-      path.append(daglish.Key(m.group('key')[1:-1]))
+        path.append(daglish.Attr.get(text))
+    elif kind == 'index':
+      path.append(daglish.Index.get(int(text)))
+    elif kind == 'key':
+      path.append(daglish.Key.get(text[1:-1]))
     else:
       raise ValueError(f'Unable to parse path {path_str!r} at {m}')
-  path = tuple(path)
-  return path
+  return tuple(path)
 
 
 # Helper function to make expected References easier to write (and read).